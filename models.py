@@ -115,6 +115,10 @@ class Workout(db.Model):
     Содержит общую информацию о тренировке и её результаты
     """
     __tablename__ = 'workouts'
+    __table_args__ = (
+        # Составной индекс для отчётов, отбирающих тренировки пользователя за период
+        db.Index('ix_workouts_owner_date', 'owner_id', 'date'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.Date, nullable=False, index=True)
@@ -141,6 +145,10 @@ class WorkoutExercise(db.Model):
     Включает подходы, повторения, вес и другие параметры
     """
     __tablename__ = 'workout_exercises'
+    __table_args__ = (
+        # Составной индекс для соединения упражнений с тренировками в отчётах
+        db.Index('ix_workout_exercises_workout_exercise', 'workout_id', 'exercise_id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     workout_id = db.Column(db.Integer, db.ForeignKey('workouts.id'), nullable=False)
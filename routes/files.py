@@ -36,16 +36,16 @@ workout_export_<id>_<timestamp>.zip
     └── ...
 """
 
-from flask import Blueprint, request, flash, redirect, url_for, current_app, send_file
+from flask import Blueprint, request, flash, redirect, url_for, current_app, Response
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from models import db, Attachment, Exercise, Workout, WorkoutExercise
+from sqlalchemy.orm import joinedload, selectinload
 import os
 import uuid
 from datetime import datetime
-import json
+import orjson
 import zipfile
-import io
 
 # Создание Blueprint для работы с файлами
 files_bp = Blueprint('files', __name__)
@@ -54,6 +54,7 @@ files_bp = Blueprint('files', __name__)
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf', 'txt', 'csv', 'json'}
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20 МБ в байтах
 MAX_TOTAL_SIZE = 100 * 1024 * 1024  # 100 МБ в байтах
+EXPORT_CHUNK_SIZE = 64 * 1024  # Размер блока при потоковой записи файлов в ZIP-архив
 
 
 # Регистрация функции форматирования размера файла как фильтра Jinja2
@@ -148,6 +149,88 @@ def format_file_size(size_bytes):
         return f"{size_bytes / (1024 * 1024):.1f} МБ"
 
 
+class ZipStreamBuffer:
+    """
+    Буфер для потоковой записи ZIP-архива
+
+    Принимает данные от zipfile.ZipFile и отдаёт накопленные байты по частям,
+    поэтому архив передаётся клиенту по мере формирования без хранения целиком в памяти
+    Буфер не поддерживает seek, и zipfile записывает размеры файлов в дескрипторы данных
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """Получить и очистить накопленные данные"""
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(json_name, json_content, files):
+    """
+    Генератор потокового ZIP-архива для экспорта
+
+    Прикреплённые файлы сохраняются без сжатия (ZIP_STORED): изображения и PDF практически
+    не сжимаются, а данные передаются блоками по EXPORT_CHUNK_SIZE байт
+    JSON с метаданными сжимается с минимальным уровнем, которого достаточно для текста
+
+    Args:
+        json_name: Имя JSON файла с метаданными в корне архива
+        json_content: Содержимое JSON файла в байтах
+        files: Список пар (путь к файлу на диске, путь в архиве)
+
+    Yields:
+        Очередная часть ZIP-архива в байтах
+    """
+    buffer = ZipStreamBuffer()
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zip_file:
+        zip_file.writestr(json_name, json_content,
+                          compress_type=zipfile.ZIP_DEFLATED, compresslevel=1)
+        yield buffer.drain()
+
+        for file_path, archive_path in files:
+            # Дата изменения и размер берутся из файла на диске как при ZipFile.write
+            zip_info = zipfile.ZipInfo.from_file(file_path, archive_path)
+
+            with open(file_path, 'rb') as source, zip_file.open(zip_info, 'w') as target:
+                while chunk := source.read(EXPORT_CHUNK_SIZE):
+                    target.write(chunk)
+                    yield buffer.drain()
+
+            yield buffer.drain()
+
+    # Центральный каталог архива записывается при закрытии ZipFile
+    yield buffer.drain()
+
+
+def zip_response(chunks, download_name):
+    """
+    Формирование потокового ответа с ZIP-архивом для скачивания
+
+    Args:
+        chunks: Генератор частей архива
+        download_name: Имя файла для скачивания
+
+    Returns:
+        Объект Response с потоковой передачей архива
+    """
+    return Response(
+        chunks,
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={download_name}'}
+    )
+
+
 @files_bp.route('/exercises/<int:exercise_id>/upload', methods=['POST'])
 @login_required
 def upload_file(exercise_id):
@@ -333,58 +416,45 @@ def export_exercise(exercise_id):
     Returns:
         ZIP-файл для скачивания с данными упражнения и всеми прикреплёнными файлами
     """
-    exercise = Exercise.query.get_or_404(exercise_id)
+    # Файлы упражнения загружаются вместе с ним одним дополнительным запросом
+    exercise = Exercise.query.options(
+        selectinload(Exercise.attachments)
+    ).get_or_404(exercise_id)
 
     # Проверка доступа к упражнению
     if not exercise.is_public and exercise.owner_id != current_user.id:
         flash('У вас нет доступа к данному упражнению для экспорта его данных из системы', 'danger')
         return redirect(url_for('exercises.detail', id=exercise_id))
 
-    # Создание ZIP архива в памяти
-    zip_buffer = io.BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Создание JSON с данными упражнения
-        exercise_data = {
-            'id': exercise.id,
-            'name': exercise.name,
-            'description': exercise.description,
-            'muscle_group': exercise.muscle_group,
-            'equipment': exercise.equipment,
-            'difficulty': exercise.difficulty,
-            'is_public': exercise.is_public,
-            'created_at': exercise.created_at.strftime('%Y-%m-%d %H:%M:%S') if exercise.created_at else None,
-            'exported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'exported_by': current_user.username
-        }
-
-        # Добавление exercise.json в корень архива
-        json_content = json.dumps(exercise_data, ensure_ascii=False, indent=2)
-        zip_file.writestr('exercise.json', json_content)
-
-        # Добавление прикреплённых файлов
-        attachments = Attachment.query.filter_by(exercise_id=exercise_id).all()
-
-        if attachments:
-            for attachment in attachments:
-                if os.path.exists(attachment.file_path):
-                    # Добавление файла в папку attachments с оригинальным именем
-                    arcname = os.path.join('attachments', attachment.original_filename)
-                    zip_file.write(attachment.file_path, arcname)
+    # Создание JSON с данными упражнения
+    exercise_data = {
+        'id': exercise.id,
+        'name': exercise.name,
+        'description': exercise.description,
+        'muscle_group': exercise.muscle_group,
+        'equipment': exercise.equipment,
+        'difficulty': exercise.difficulty,
+        'is_public': exercise.is_public,
+        'created_at': exercise.created_at.strftime('%Y-%m-%d %H:%M:%S') if exercise.created_at else None,
+        'exported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'exported_by': current_user.username
+    }
+    # orjson сразу формирует байты в UTF-8 без промежуточной строки
+    json_content = orjson.dumps(exercise_data, option=orjson.OPT_INDENT_2)
 
-    # Подготовка буфера для отправки
-    zip_buffer.seek(0)
+    # Прикреплённые файлы добавляются в папку attachments с оригинальным именем
+    files = [
+        (attachment.file_path, os.path.join('attachments', attachment.original_filename))
+        for attachment in exercise.attachments
+        if os.path.exists(attachment.file_path)
+    ]
 
     # Формирование имени файла для скачивания
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     zip_filename = f"exercise_{exercise_id}_{timestamp}.zip"
 
-    return send_file(
-        zip_buffer,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=zip_filename
-    )
+    # Архив формируется и передаётся по частям, все данные из базы собраны заранее
+    return zip_response(stream_zip('exercise.json', json_content, files), zip_filename)
 
 
 @files_bp.route('/workouts/<int:workout_id>/export_zip')
@@ -438,8 +508,14 @@ def export_zip(workout_id):
     Returns:
         ZIP-файл для скачивания
     """
-    # Получение тренировки
-    workout = Workout.query.get_or_404(workout_id)
+    # Получение тренировки вместе с владельцем, упражнениями и их файлами
+    # Связанные записи загружаются пакетными запросами вместо отдельного запроса на каждое упражнение
+    workout = Workout.query.options(
+        joinedload(Workout.owner),
+        selectinload(Workout.workout_exercises)
+        .joinedload(WorkoutExercise.exercise)
+        .selectinload(Exercise.attachments)
+    ).get_or_404(workout_id)
 
     # Проверка прав доступа
     if workout.owner_id != current_user.id and not current_user.is_admin():
@@ -467,8 +543,7 @@ def export_zip(workout_id):
         exercise = we.exercise
 
         # Получение файлов упражнения
-        attachments = Attachment.query.filter_by(exercise_id=exercise.id).all()
-        attachment_filenames = [att.original_filename for att in attachments]
+        attachment_filenames = [att.original_filename for att in exercise.attachments]
 
         exercise_data = {
             'exercise_id': exercise.id,
@@ -488,35 +563,20 @@ def export_zip(workout_id):
 
         workout_data['exercises'].append(exercise_data)
 
-    # Создание ZIP-архива в памяти
-    zip_buffer = io.BytesIO()
-
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Добавление workout.json
-        workout_json = json.dumps(workout_data, ensure_ascii=False, indent=4)
-        zip_file.writestr('workout.json', workout_json)
-
-        # Добавление файлов упражнений
-        for we in workout.workout_exercises:
-            exercise = we.exercise
-            attachments = Attachment.query.filter_by(exercise_id=exercise.id).all()
+    # orjson сразу формирует байты в UTF-8 без промежуточной строки
+    workout_json = orjson.dumps(workout_data, option=orjson.OPT_INDENT_2)
 
-            for att in attachments:
-                if os.path.exists(att.file_path):
-                    # Путь в архиве: attachments/<exercise_id>_<filename>
-                    archive_path = f'attachments/{exercise.id}_{att.original_filename}'
-                    zip_file.write(att.file_path, archive_path)
-
-    # Подготовка буфера для отправки
-    zip_buffer.seek(0)
+    # Файлы упражнений, путь в архиве: attachments/<exercise_id>_<filename>
+    files = [
+        (att.file_path, f'attachments/{we.exercise.id}_{att.original_filename}')
+        for we in workout.workout_exercises
+        for att in we.exercise.attachments
+        if os.path.exists(att.file_path)
+    ]
 
     # Формирование имени файла
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f'workout_export_{workout.id}_{timestamp}.zip'
 
-    return send_file(
-        zip_buffer,
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=filename
-    )
+    # Архив формируется и передаётся по частям, все данные из базы собраны заранее
+    return zip_response(stream_zip('workout.json', workout_json, files), filename)
@@ -21,17 +21,179 @@ CSV схема: Тип тренировки | Количество тренир
 CSV схема: Дата | Упражнение | Макс вес (кг) | Подходы | Повторения
 """
 
-from flask import Blueprint, render_template, request, flash, redirect, url_for, make_response
+from flask import Blueprint, render_template, request, flash, redirect, url_for, Response, stream_with_context
 from flask_login import login_required, current_user
 from models import db, Workout, WorkoutExercise, Exercise
 from datetime import datetime, timedelta
 from sqlalchemy import func, and_
 import csv
 import io
+from itertools import islice
 
 # Создание Blueprint для модуля отчётов
 reports_bp = Blueprint('reports', __name__, url_prefix='/reports')
 
+# Количество строк, записываемых в CSV за один пакет при экспорте
+EXPORT_BATCH_SIZE = 1000
+
+
+def stream_csv(header, rows):
+    """
+    Генератор CSV файла по частям
+
+    Строки записываются пакетами по EXPORT_BATCH_SIZE через csv.writer.writerows
+    во временный буфер, содержимое которого отдаётся клиенту одним фрагментом
+
+    Args:
+        header: Заголовки колонок
+        rows: Итерируемый объект со строками данных
+
+    Yields:
+        Фрагменты CSV файла с разделителем "точка с запятой", первой отдаётся метка UTF-8 BOM
+    """
+    # BOM (Byte Order Mark) необходим для того чтобы Microsoft Excel правильно определил кодировку файла
+    yield '\ufeff'
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    writer.writerow(header)
+
+    rows = iter(rows)
+    while True:
+        writer.writerows(islice(rows, EXPORT_BATCH_SIZE))
+        chunk = buffer.getvalue()
+        if not chunk:
+            return
+        yield chunk
+
+        # Очистка буфера перед записью следующего пакета строк
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def csv_response(chunks, download_name):
+    """
+    Формирование потокового HTTP ответа с CSV файлом
+
+    Args:
+        chunks: Генератор частей CSV файла
+        download_name: Имя файла для скачивания
+
+    Returns:
+        Объект Response, отдающий файл клиенту по мере формирования
+    """
+    response = Response(stream_with_context(chunks), content_type='text/csv; charset=utf-8')
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    return response
+
+
+def volume_report_query(owner_id, date_from, date_to):
+    """
+    Запрос агрегированных показателей отчёта "Объём тренировок за период"
+
+    Группировка выполняется на стороне базы данных: сначала показатели упражнений
+    суммируются по каждой тренировке, затем тренировки группируются по типу.
+    Предварительная агрегация по тренировке нужна, чтобы соединение с упражнениями
+    не умножало количество и продолжительность тренировок
+
+    Args:
+        owner_id: ID владельца тренировок
+        date_from: Дата начала периода
+        date_to: Дата окончания периода
+
+    Returns:
+        Запрос, возвращающий строки (workout_type, total_workouts, total_duration,
+        total_exercises, total_weight) в алфавитном порядке типов тренировок
+    """
+    # Отбор тренировок пользователя за период, общий для подзапроса и основного запроса
+    workout_filter = and_(
+        Workout.owner_id == owner_id,
+        Workout.date >= date_from,
+        Workout.date <= date_to
+    )
+
+    # Формулы 3 и 4: SUM(sets × reps) и SUM(sets × reps × weight) по каждой тренировке, пустой вес считается нулевым
+    # Подзапрос ограничен тренировками пользователя за период, чтобы не агрегировать упражнения всех пользователей
+    exercise_totals = db.session.query(
+        WorkoutExercise.workout_id.label('workout_id'),
+        func.sum(WorkoutExercise.sets * WorkoutExercise.reps).label('total_exercises'),
+        func.sum(
+            WorkoutExercise.sets * WorkoutExercise.reps * func.coalesce(WorkoutExercise.weight, 0.0)
+        ).label('total_weight')
+    ).join(
+        Workout, WorkoutExercise.workout_id == Workout.id
+    ).filter(workout_filter).group_by(WorkoutExercise.workout_id).subquery()
+
+    # Формулы 1 и 2: COUNT(workouts) и SUM(duration) по типам тренировок
+    return db.session.query(
+        Workout.workout_type.label('workout_type'),
+        func.count(Workout.id).label('total_workouts'),
+        func.coalesce(func.sum(Workout.duration), 0).label('total_duration'),
+        func.coalesce(func.sum(exercise_totals.c.total_exercises), 0).label('total_exercises'),
+        func.coalesce(func.sum(exercise_totals.c.total_weight), 0.0).label('total_weight')
+    ).outerjoin(
+        exercise_totals, exercise_totals.c.workout_id == Workout.id
+    ).filter(workout_filter).group_by(Workout.workout_type).order_by(Workout.workout_type)
+
+
+def records_report_query(owner_id, date_from, date_to, exercise_id=None):
+    """
+    Запрос личных рекордов для отчёта "Динамика личных рекордов"
+
+    Выполнения упражнений нумеруются оконной функцией ROW_NUMBER() в пределах каждого
+    упражнения по убыванию веса, а при равном весе - по убыванию числа повторений.
+    Рекордом считается первое выполнение в каждой группе
+
+    Args:
+        owner_id: ID владельца тренировок
+        date_from: Дата начала периода
+        date_to: Дата окончания периода
+        exercise_id: ID упражнения для отбора рекорда только по нему (необязательно)
+
+    Returns:
+        Запрос, возвращающий строки (exercise_name, date, max_weight, sets, reps),
+        отсортированные по дате в обратном порядке (новые записи первыми)
+    """
+    # Пустой вес считается нулевым
+    weight = func.coalesce(WorkoutExercise.weight, 0)
+
+    # Формулы 1 и 2: MAX(weight) и MAX(reps) WHERE weight = max_weight через порядок нумерации
+    ranked = db.session.query(
+        WorkoutExercise.exercise_id.label('exercise_id'),
+        Workout.date.label('date'),
+        weight.label('max_weight'),
+        WorkoutExercise.sets.label('sets'),
+        WorkoutExercise.reps.label('reps'),
+        func.row_number().over(
+            partition_by=WorkoutExercise.exercise_id,
+            order_by=(weight.desc(), WorkoutExercise.reps.desc())
+        ).label('position')
+    ).join(
+        Workout, WorkoutExercise.workout_id == Workout.id
+    ).filter(
+        and_(
+            Workout.owner_id == owner_id,
+            Workout.date >= date_from,
+            Workout.date <= date_to
+        )
+    )
+
+    # Применение фильтра по упражнению до нумерации, чтобы не ранжировать лишние строки
+    if exercise_id:
+        ranked = ranked.filter(WorkoutExercise.exercise_id == exercise_id)
+
+    ranked = ranked.subquery()
+
+    return db.session.query(
+        Exercise.name.label('exercise_name'),
+        ranked.c.date,
+        ranked.c.max_weight,
+        ranked.c.sets,
+        ranked.c.reps
+    ).join(
+        ranked, ranked.c.exercise_id == Exercise.id
+    ).filter(ranked.c.position == 1).order_by(ranked.c.date.desc())
+
 
 @reports_bp.route('/')
 @login_required
@@ -85,64 +247,12 @@ def volume():
         flash('Произошла ошибка при обработке введённых дат. Пожалуйста, убедитесь что вы используете правильный формат даты ГГГГ-ММ-ДД', 'danger')
         return redirect(url_for('reports.volume'))
 
-    # Выполнение запроса к базе данных для получения всех тренировок пользователя за указанный период
-    workouts = Workout.query.filter(
-        and_(
-            Workout.owner_id == current_user.id,
-            Workout.date >= date_from_obj,
-            Workout.date <= date_to_obj
-        )
-    ).all()
-
-    # Группировка данных по типам тренировок для формирования агрегированного отчёта
-    # Используем словарь для накопления показателей по каждому типу тренировки
-    workout_types_data = {}
-
-    # Итерация по всем тренировкам для расчёта агрегированных показателей
-    for workout in workouts:
-        workout_type = workout.workout_type
-
-        # Инициализация структуры данных для нового типа тренировки если он встретился впервые
-        if workout_type not in workout_types_data:
-            workout_types_data[workout_type] = {
-                'workout_type': workout_type,
-                'total_workouts': 0,      # Счётчик количества тренировок
-                'total_duration': 0,      # Суммарная продолжительность
-                'total_exercises': 0,     # Суммарное количество выполненных упражнений
-                'total_weight': 0.0       # Суммарный поднятый вес
-            }
-
-        # Формула 1: COUNT(workouts) - увеличиваем счётчик тренировок данного типа
-        workout_types_data[workout_type]['total_workouts'] += 1
-
-        # Формула 2: SUM(duration) - добавляем продолжительность текущей тренировки к общей сумме
-        if workout.duration:
-            workout_types_data[workout_type]['total_duration'] += workout.duration
-
-        # Обработка всех упражнений в рамках текущей тренировки для расчёта детализированных показателей
-        for we in workout.workout_exercises:
-            # Формула 3: SUM(sets × reps) - подсчёт общего количества выполненных упражнений
-            sets = we.sets if we.sets else 0
-            reps = we.reps if we.reps else 0
-            workout_types_data[workout_type]['total_exercises'] += sets * reps
-
-            # Формула 4: SUM(sets × reps × weight) - подсчёт общего поднятого веса
-            if we.weight:
-                workout_types_data[workout_type]['total_weight'] += sets * reps * we.weight
-
-    # Преобразование словаря в список для удобства отображения и сортировки данных
-    report_data = []
-    for data in workout_types_data.values():
-        report_data.append({
-            'workout_type': data['workout_type'],
-            'total_workouts': data['total_workouts'],
-            'total_duration': data['total_duration'],
-            'total_exercises': data['total_exercises'],
-            'total_weight': round(data['total_weight'], 2)  # Округление до двух знаков после запятой
-        })
-
-    # Сортировка отчёта по типу тренировки в алфавитном порядке для удобства восприятия
-    report_data.sort(key=lambda x: x['workout_type'])
+    # Агрегация показателей по типам тренировок выполняется одним запросом с группировкой в базе данных
+    # Суммарный вес округляется до двух знаков после запятой для удобства восприятия
+    report_data = [
+        dict(row._asdict(), total_weight=round(row.total_weight, 2))
+        for row in volume_report_query(current_user.id, date_from_obj, date_to_obj)
+    ]
 
     # Отображение HTML страницы с результатами отчёта
     return render_template('reports/volume.html',
@@ -179,64 +289,23 @@ def volume_export():
         flash('Произошла ошибка при обработке дат для экспорта', 'danger')
         return redirect(url_for('reports.volume'))
 
-    # Получение данных тренировок (аналогично основной функции)
-    workouts = Workout.query.filter(
-        and_(
-            Workout.owner_id == current_user.id,
-            Workout.date >= date_from_obj,
-            Workout.date <= date_to_obj
+    # Строки агрегированного запроса записываются в CSV по мере отдачи ответа клиенту
+    rows = (
+        (
+            workout_type,                           # Тип тренировки
+            total_workouts,                         # Количество тренировок данного типа
+            total_duration,                         # Общая продолжительность в минутах
+            total_exercises,                        # Общее количество упражнений
+            round(total_weight, 2)                  # Общий вес с округлением
         )
-    ).all()
-
-    # Группировка по типам тренировок
-    workout_types_data = {}
-    for workout in workouts:
-        workout_type = workout.workout_type
-        if workout_type not in workout_types_data:
-            workout_types_data[workout_type] = {
-                'total_workouts': 0,
-                'total_duration': 0,
-                'total_exercises': 0,
-                'total_weight': 0.0
-            }
-
-        workout_types_data[workout_type]['total_workouts'] += 1
-        if workout.duration:
-            workout_types_data[workout_type]['total_duration'] += workout.duration
-
-        for we in workout.workout_exercises:
-            sets = we.sets if we.sets else 0
-            reps = we.reps if we.reps else 0
-            workout_types_data[workout_type]['total_exercises'] += sets * reps
-            if we.weight:
-                workout_types_data[workout_type]['total_weight'] += sets * reps * we.weight
-
-    # Создание CSV файла в памяти с использованием кодировки UTF-8 с BOM
-    # BOM (Byte Order Mark) необходим для того чтобы Microsoft Excel правильно определил кодировку файла
-    output = io.StringIO()
-    output.write('\ufeff')  # Добавление UTF-8 BOM в начало файла
+        for workout_type, total_workouts, total_duration, total_exercises, total_weight
+        in volume_report_query(current_user.id, date_from_obj, date_to_obj)
+    )
 
-    # Инициализация CSV writer с разделителем "точка с запятой" для русской локали Excel
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    # Заголовки колонок согласно схеме отчёта
+    header = ['Тип тренировки', 'Количество тренировок', 'Общее время (мин)', 'Всего упражнений', 'Общий вес (кг)']
 
-    # Запись заголовков колонок согласно схеме отчёта
-    writer.writerow(['Тип тренировки', 'Количество тренировок', 'Общее время (мин)', 'Всего упражнений', 'Общий вес (кг)'])
-
-    # Запись строк данных в CSV файл
-    for workout_type, data in sorted(workout_types_data.items()):
-        writer.writerow([
-            workout_type,                           # Тип тренировки
-            data['total_workouts'],                 # Количество тренировок данного типа
-            data['total_duration'],                 # Общая продолжительность в минутах
-            data['total_exercises'],                # Общее количество упражнений
-            round(data['total_weight'], 2)          # Общий вес с округлением
-        ])
-
-    # Формирование HTTP ответа с корректными заголовками для скачивания файла
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=workout_volume_{date_from}_{date_to}.csv'
-    return response
+    return csv_response(stream_csv(header, rows), f'workout_volume_{date_from}_{date_to}.csv')
 
 
 @reports_bp.route('/records', methods=['GET'])
@@ -281,73 +350,16 @@ def records():
         flash('Произошла ошибка при обработке введённых дат. Пожалуйста, убедитесь что вы используете правильный формат даты ГГГГ-ММ-ДД', 'danger')
         return redirect(url_for('reports.records'))
 
-    # Построение базового SQL запроса для получения данных о личных рекордах по упражнениям
-    # Применяем фильтрацию по датам для получения рекордов только за указанный период
-    base_query = db.session.query(WorkoutExercise, Workout, Exercise).join(
-        Workout, WorkoutExercise.workout_id == Workout.id
-    ).join(
-        Exercise, WorkoutExercise.exercise_id == Exercise.id
-    ).filter(
-        and_(
-            Workout.owner_id == current_user.id,
-            Workout.date >= date_from_obj,
-            Workout.date <= date_to_obj
-        )
-    )
-
-    # Применение дополнительного фильтра по упражнению если он был указан пользователем
-    if exercise_id:
-        base_query = base_query.filter(Exercise.id == exercise_id)
-
-    # Выполнение запроса и получение всех записей тренировок с упражнениями
-    workout_exercises_data = base_query.all()
-
-    # Группировка данных по упражнениям для подсчёта максимальных показателей
-    # Используем словарь где ключ - это ID упражнения, значение - список всех выполнений
-    exercises_records = {}
-    for we, workout, exercise in workout_exercises_data:
-        if exercise.id not in exercises_records:
-            exercises_records[exercise.id] = {
-                'exercise_name': exercise.name,
-                'records': []  # Список всех выполнений упражнения
-            }
-
-        # Добавляем информацию о выполнении упражнения в список записей
-        exercises_records[exercise.id]['records'].append({
-            'date': workout.date,
-            'weight': we.weight if we.weight else 0,
-            'sets': we.sets if we.sets else 0,
-            'reps': we.reps if we.reps else 0
-        })
-
-    # Формирование итогового отчёта с личными рекордами
-    report_data = []
-    for exercise_id, data in exercises_records.items():
-        if not data['records']:
-            continue
-
-        # Формула 1: MAX(weight) - поиск максимального веса среди всех выполнений упражнения
-        max_weight_record = max(data['records'], key=lambda x: x['weight'])
-
-        # Формула 2: MAX(reps) WHERE weight = max_weight - поиск максимального количества повторений при максимальном весе
-        max_weight = max_weight_record['weight']
-        records_with_max_weight = [r for r in data['records'] if r['weight'] == max_weight]
-        max_reps_record = max(records_with_max_weight, key=lambda x: x['reps']) if records_with_max_weight else max_weight_record
-
-        # Добавление рассчитанных данных в отчёт
-        report_data.append({
-            'exercise_name': data['exercise_name'],
-            'date': max_reps_record['date'],
-            'max_weight': round(max_weight, 2),
-            'sets': max_reps_record['sets'],
-            'reps': max_reps_record['reps']
-        })
-
-    # Сортировка отчёта по дате в обратном порядке (новые записи первыми)
-    report_data.sort(key=lambda x: x['date'], reverse=True)
+    # Поиск рекорда по каждому упражнению выполняется одним запросом с оконной функцией в базе данных
+    # Максимальный вес округляется до двух знаков после запятой
+    report_data = [
+        dict(row._asdict(), max_weight=round(row.max_weight, 2))
+        for row in records_report_query(current_user.id, date_from_obj, date_to_obj, exercise_id)
+    ]
 
     # Получение списка всех упражнений пользователя для выпадающего списка фильтров
-    all_exercises = db.session.query(Exercise).join(
+    # Для списка нужны только идентификатор и название, поэтому ORM объекты не создаются
+    all_exercises = db.session.query(Exercise.id, Exercise.name).join(
         WorkoutExercise, Exercise.id == WorkoutExercise.exercise_id
     ).join(
         Workout, WorkoutExercise.workout_id == Workout.id
@@ -393,84 +405,20 @@ def records_export():
         flash('Произошла ошибка при обработке дат для экспорта', 'danger')
         return redirect(url_for('reports.records'))
 
-    # Получение данных (аналогично основной функции)
-    base_query = db.session.query(WorkoutExercise, Workout, Exercise).join(
-        Workout, WorkoutExercise.workout_id == Workout.id
-    ).join(
-        Exercise, WorkoutExercise.exercise_id == Exercise.id
-    ).filter(
-        and_(
-            Workout.owner_id == current_user.id,
-            Workout.date >= date_from_obj,
-            Workout.date <= date_to_obj
+    # Строки запроса рекордов записываются в CSV по мере отдачи ответа клиенту
+    rows = (
+        (
+            record_date.strftime('%d.%m.%Y'),       # Дата в формате ДД.ММ.ГГГГ
+            exercise_name,                          # Название упражнения
+            round(max_weight, 2),                   # Максимальный вес в килограммах
+            sets,                                   # Количество подходов
+            reps                                    # Количество повторений
         )
+        for exercise_name, record_date, max_weight, sets, reps
+        in records_report_query(current_user.id, date_from_obj, date_to_obj, exercise_id)
     )
 
-    if exercise_id:
-        base_query = base_query.filter(Exercise.id == exercise_id)
-
-    workout_exercises_data = base_query.all()
-
-    # Группировка и расчёт рекордов
-    exercises_records = {}
-    for we, workout, exercise in workout_exercises_data:
-        if exercise.id not in exercises_records:
-            exercises_records[exercise.id] = {
-                'exercise_name': exercise.name,
-                'records': []
-            }
-
-        exercises_records[exercise.id]['records'].append({
-            'date': workout.date,
-            'weight': we.weight if we.weight else 0,
-            'sets': we.sets if we.sets else 0,
-            'reps': we.reps if we.reps else 0
-        })
-
-    # Формирование данных отчёта
-    report_data = []
-    for exercise_id, data in exercises_records.items():
-        if not data['records']:
-            continue
-
-        max_weight_record = max(data['records'], key=lambda x: x['weight'])
-        max_weight = max_weight_record['weight']
-        records_with_max_weight = [r for r in data['records'] if r['weight'] == max_weight]
-        max_reps_record = max(records_with_max_weight, key=lambda x: x['reps']) if records_with_max_weight else max_weight_record
-
-        report_data.append({
-            'exercise_name': data['exercise_name'],
-            'date': max_reps_record['date'],
-            'max_weight': round(max_weight, 2),
-            'sets': max_reps_record['sets'],
-            'reps': max_reps_record['reps']
-        })
-
-    report_data.sort(key=lambda x: x['date'], reverse=True)
-
-    # Создание CSV файла в памяти с использованием кодировки UTF-8 с BOM
-    # BOM (Byte Order Mark) необходим для того чтобы Microsoft Excel правильно определил кодировку файла
-    output = io.StringIO()
-    output.write('\ufeff')  # Добавление UTF-8 BOM в начало файла
-
-    # Инициализация CSV writer с разделителем "точка с запятой" для русской локали Excel
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-
-    # Запись заголовков колонок согласно схеме отчёта
-    writer.writerow(['Дата', 'Упражнение', 'Макс вес (кг)', 'Подходы', 'Повторения'])
-
-    # Запись строк данных в CSV файл
-    for row in report_data:
-        writer.writerow([
-            row['date'].strftime('%d.%m.%Y'),      # Дата в формате ДД.ММ.ГГГГ
-            row['exercise_name'],                   # Название упражнения
-            row['max_weight'],                      # Максимальный вес в килограммах
-            row['sets'],                            # Количество подходов
-            row['reps']                             # Количество повторений
-        ])
-
-    # Формирование HTTP ответа с корректными заголовками для скачивания файла
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv; charset=utf-8'
-    response.headers['Content-Disposition'] = f'attachment; filename=personal_records_{date_from}_{date_to}.csv'
-    return response
+    # Заголовки колонок согласно схеме отчёта
+    header = ['Дата', 'Упражнение', 'Макс вес (кг)', 'Подходы', 'Повторения']
+
+    return csv_response(stream_csv(header, rows), f'personal_records_{date_from}_{date_to}.csv')
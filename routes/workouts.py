@@ -143,11 +143,19 @@ def new():
             return render_template('workouts/form.html',
                                  workout_types=['Силовая', 'Кардио', 'Смешанная', 'Растяжка', 'Функциональная'])
 
+        # Длительность необязательна, но если указана, должна быть целым числом
+        try:
+            duration = int(duration) if duration else None
+        except ValueError:
+            flash('Длительность тренировки должна быть целым числом минут', 'danger')
+            return render_template('workouts/form.html',
+                                 workout_types=['Силовая', 'Кардио', 'Смешанная', 'Растяжка', 'Функциональная'])
+
         # Создание тренировки
         workout = Workout(
             date=workout_date_obj,
             workout_type=workout_type,
-            duration=int(duration) if duration else None,
+            duration=duration,
             notes=notes,
             owner_id=current_user.id
         )
@@ -198,10 +206,19 @@ def edit(id):
                                  workout=workout,
                                  workout_types=['Силовая', 'Кардио', 'Смешанная', 'Растяжка', 'Функциональная'])
 
+        # Длительность необязательна, но если указана, должна быть целым числом
+        try:
+            duration = int(duration) if duration else None
+        except ValueError:
+            flash('Длительность тренировки должна быть целым числом минут', 'danger')
+            return render_template('workouts/form.html',
+                                 workout=workout,
+                                 workout_types=['Силовая', 'Кардио', 'Смешанная', 'Растяжка', 'Функциональная'])
+
         # Обновление тренировки
         workout.date = workout_date_obj
         workout.workout_type = workout_type
-        workout.duration = int(duration) if duration else None
+        workout.duration = duration
         workout.notes = notes
 
         db.session.commit()
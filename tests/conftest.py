@@ -4,72 +4,180 @@
 """
 import pytest
 import os
-import tempfile
+
+# Тестовая база данных SQLite в памяти
+# URI задаётся через переменную окружения до импорта приложения, так как движок
+# Flask-SQLAlchemy создаётся при инициализации приложения (db.init_app).
+# Для :memory: Flask-SQLAlchemy сам подключает StaticPool и check_same_thread=False,
+# поэтому все соединения тестового клиента видят одну и ту же базу
+# Каждый процесс pytest-xdist получает собственную базу в памяти и собственную
+# директорию загрузок (tmp_path_factory), поэтому при параллельном запуске
+# тесты разных процессов не влияют друг на друга
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+
 from app import app as flask_app, init_db
+from flask_sqlalchemy.session import Session as FlaskSession
+import models
 from models import db, User, Role, Exercise, Workout, WorkoutExercise, Attachment
+from sqlalchemy import event
 from datetime import datetime, date
 
+# Пароль всех тестовых пользователей
+TEST_PASSWORD = 'Password123'
 
-@pytest.fixture
-def app():
+
+class _TransactionalSession(FlaskSession):
     """
-    Фикстура для создания тестового приложения Flask
-    Настраивает приложение в тестовом режиме с временной базой данных SQLite в памяти
+    Сессия Flask-SQLAlchemy, привязанная к внешнему соединению теста
+    Стандартная сессия выбирает движок по bind_key и игнорирует bind,
+    поэтому все запросы явно направляются в соединение с открытой транзакцией
     """
-    # Создание временного файла для базы данных
-    db_fd, db_path = tempfile.mkstemp()
 
-    # Настройка приложения для тестирования
-    flask_app.config['TESTING'] = True
-    flask_app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
-    flask_app.config['WTF_CSRF_ENABLED'] = False
-    flask_app.config['SECRET_KEY'] = 'test-secret-key'
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        return bind if bind is not None else self.bind
 
-    # Настройка директории для загрузки файлов
-    upload_folder = tempfile.mkdtemp()
-    flask_app.config['UPLOAD_FOLDER'] = upload_folder
 
-    # Инициализация базы данных с тестовыми данными
-    with flask_app.app_context():
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """
+    Фикстура для создания тестового приложения Flask
+    Настраивает приложение в тестовом режиме с базой данных SQLite в памяти
+    Схема базы данных и обработчики событий движка создаются один раз на всю тестовую сессию
+    (при запуске через pytest-xdist - один раз в каждом процессе)
+    Контекст запроса для каждого теста создаёт pytest-flask, поэтому тесты и фикстуры
+    уровня функции работают с базой данных без явного app_context
+    """
+    # Настройка приложения для тестирования
+    config = {
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SECRET_KEY': 'test-secret-key',
+        # Директория для загрузки файлов
+        # Создаётся один раз на сессию во временном каталоге pytest, который очищается автоматически
+        'UPLOAD_FOLDER': str(tmp_path_factory.mktemp('uploads')),
+        # Ограничение размера запроса снимается, иначе Werkzeug отвечает 413 ещё до вызова
+        # представления загрузки и проверки MAX_FILE_SIZE и MAX_TOTAL_SIZE не выполняются
+        'MAX_CONTENT_LENGTH': None,
+    }
+    flask_app.config.update(config)
+    test_app = flask_app
+
+    with test_app.app_context():
+        # pysqlite сам управляет транзакциями и не поддерживает SAVEPOINT,
+        # поэтому BEGIN выдаётся явно (рекомендация документации SQLAlchemy)
+        @event.listens_for(db.engine, 'connect')
+        def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        # Тестовая база данных одноразовая, поэтому синхронизация с диском не нужна
+        # (для базы в памяти настройки журнала уже такие, но остаются верными и для файла)
+        @event.listens_for(db.engine, 'connect')
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('PRAGMA synchronous=OFF')
+            cursor.execute('PRAGMA journal_mode=MEMORY')
+            cursor.execute('PRAGMA temp_store=MEMORY')
+            cursor.close()
+
+        @event.listens_for(db.engine, 'begin')
+        def _emit_begin(connection):
+            connection.exec_driver_sql('BEGIN')
+
         db.create_all()
 
-        # Создание ролей для тестирования
-        viewer_role = Role(name='viewer', description='Роль для просмотра данных без возможности редактирования')
-        editor_role = Role(name='editor', description='Роль для редактирования данных в предметной области тренировок')
-        admin_role = Role(name='admin', description='Административная роль с полным доступом ко всем функциям системы')
+    yield test_app
 
-        db.session.add(viewer_role)
-        db.session.add(editor_role)
-        db.session.add(admin_role)
-        db.session.commit()
+    # Очистка после тестов
+    with test_app.app_context():
+        db.session.remove()
+        db.drop_all()
 
-        # Создание тестовых пользователей с разными ролями
-        # Пользователь с ролью viewer
-        viewer_user = User(username='viewer', email='viewer@test.com', role_id=viewer_role.id)
-        viewer_user.set_password('Password123')
 
-        # Пользователь с ролью editor
-        editor_user = User(username='editor', email='editor@test.com', role_id=editor_role.id)
-        editor_user.set_password('Password123')
+def _plain_password_hash(password, **kwargs):
+    """Быстрая замена generate_password_hash для тестов"""
+    return 'plain$' + password
 
-        # Пользователь с ролью admin
-        admin_user = User(username='admin', email='admin@test.com', role_id=admin_role.id)
-        admin_user.set_password('Password123')
 
-        db.session.add(viewer_user)
-        db.session.add(editor_user)
-        db.session.add(admin_user)
-        db.session.commit()
+def _check_plain_password_hash(pwhash, password):
+    """Быстрая замена check_password_hash для тестов"""
+    return pwhash == 'plain$' + password
 
-    yield flask_app
 
-    # Очистка после тестов
-    with flask_app.app_context():
-        db.session.remove()
-        db.drop_all()
+@pytest.fixture(scope='session')
+def _fast_password_hashing(app):
+    """
+    Фикстура для замены медленного хэширования паролей в тестовом режиме
+    KDF из werkzeug.security намеренно медленный и занимает основную часть
+    времени подготовки пользователей, поэтому в тестах используется тривиальная схема
+    """
+    if not app.config['TESTING']:
+        yield
+        return
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(models, 'generate_password_hash', _plain_password_hash)
+        mp.setattr(models, 'check_password_hash', _check_plain_password_hash)
+        yield
 
-    os.close(db_fd)
-    os.unlink(db_path)
+
+@pytest.fixture(scope='session')
+def _seed(app, _fast_password_hashing):
+    """
+    Фикстура для заполнения базы данных ролями и тестовыми пользователями
+    Выполняется один раз на всю тестовую сессию
+    """
+    with app.app_context():
+        # Автоматический flush при заполнении не нужен: роли и пользователи вставляются
+        # напрямую через Core, остальное фиксируется одним commit
+        with db.session.no_autoflush:
+            # Создание ролей для тестирования одним executemany без создания ORM объектов
+            roles = Role.__table__
+            role_ids = dict(db.session.execute(
+                roles.insert().returning(roles.c.name, roles.c.id),
+                [
+                    {'name': 'viewer', 'description': 'Роль для просмотра данных без возможности редактирования'},
+                    {'name': 'editor', 'description': 'Роль для редактирования данных в предметной области тренировок'},
+                    {'name': 'admin', 'description': 'Административная роль с полным доступом ко всем функциям системы'},
+                ]
+            ).all())
+
+            # Все тестовые пользователи имеют одинаковый пароль, поэтому хэш вычисляется один раз
+            # (при включённой быстрой схеме хэширования используется именно она)
+            password_hash = models.generate_password_hash(TEST_PASSWORD)
+
+            # Создание тестовых пользователей viewer, editor и admin с одноимёнными ролями
+            users = User.__table__
+            user_ids = dict(db.session.execute(
+                users.insert().returning(users.c.username, users.c.id),
+                [
+                    {
+                        'username': username,
+                        'email': f'{username}@test.com',
+                        'role_id': role_ids[username],
+                        'password_hash': password_hash,
+                    }
+                    for username in ('viewer', 'editor', 'admin')
+                ]
+            ).all())
+
+            # Публичное упражнение используется тестами только для чтения,
+            # поэтому создаётся один раз (изменения в тестах откатываются)
+            exercise = Exercise(
+                name='Тестовое упражнение',
+                description='Описание тестового упражнения для проверки функционала системы',
+                muscle_group='Грудь',
+                equipment='Штанга',
+                difficulty='intermediate',
+                is_public=True
+            )
+            db.session.add(exercise)
+            db.session.commit()
+
+        # Возвращаем ID созданных объектов для использования в фикстурах
+        return {
+            'sample_exercise': exercise.id,
+            'users': user_ids,
+        }
 
 
 @pytest.fixture
@@ -81,120 +189,210 @@ def client(app):
     return app.test_client()
 
 
-@pytest.fixture
-def db_session(app):
+@pytest.fixture(autouse=True)
+def db_session(app, _seed):
     """
     Фикстура для доступа к сессии базы данных
-    Автоматически откатывает изменения после каждого теста для изоляции
+    Оборачивает каждый тест во внешнюю транзакцию и откатывает её после теста для изоляции
+    Вызовы commit() в тестах и маршрутах фиксируют только SAVEPOINT внутри этой транзакции
     """
     with app.app_context():
-        yield db
-        db.session.rollback()
+        connection = db.engine.connect()
+    transaction = connection.begin()
+
+    original_session = db.session
+    db.session = db._make_scoped_session({
+        'class_': _TransactionalSession,
+        'bind': connection,
+        'join_transaction_mode': 'create_savepoint',
+    })
+
+    yield db
+
+    db.session.remove()
+    db.session = original_session
+    transaction.rollback()
+    connection.close()
+
+
+def _logged_in_client(app, username):
+    """
+    Создание тестового клиента с выполненным входом под указанным пользователем
+    Пользователи создаются один раз на сессию, поэтому cookie сессии остаётся
+    действительной для всех тестов несмотря на откат транзакций
+    """
+    client = app.test_client()
+    client.post('/login', data={
+        'username': username,
+        'password': TEST_PASSWORD
+    }, follow_redirects=True)
+    return client
+
+
+def _reset_client_session(client):
+    """
+    Очистка временного состояния клиента оставшегося от предыдущего теста
+    Непрочитанные flash-сообщения удаляются, данные авторизации сохраняются
+    """
+    with client.session_transaction() as sess:
+        sess.pop('_flashes', None)
+    return client
+
+
+@pytest.fixture(scope='session')
+def _auth_client_raw(app, _seed):
+    """Клиент пользователя editor, вход выполняется один раз на сессию"""
+    return _logged_in_client(app, 'editor')
+
+
+@pytest.fixture(scope='session')
+def _viewer_client_raw(app, _seed):
+    """Клиент пользователя viewer, вход выполняется один раз на сессию"""
+    return _logged_in_client(app, 'viewer')
+
+
+@pytest.fixture(scope='session')
+def _admin_client_raw(app, _seed):
+    """Клиент администратора, вход выполняется один раз на сессию"""
+    return _logged_in_client(app, 'admin')
 
 
 @pytest.fixture
-def auth_client(client, app):
+def auth_client(_auth_client_raw):
     """
     Фикстура для создания клиента с авторизованным пользователем
     По умолчанию авторизуется под пользователем editor для тестирования функций редактирования
     """
-    with app.app_context():
-        # Авторизация как editor (доступны функции редактирования)
-        client.post('/login', data={
-            'username': 'editor',
-            'password': 'Password123'
-        }, follow_redirects=True)
+    return _reset_client_session(_auth_client_raw)
 
-    return client
+
+@pytest.fixture(scope='module')
+def module_auth_client(_auth_client_raw):
+    """
+    Клиент пользователя editor для фикстур уровня модуля
+    Как и auth_client, очищает flash-сообщения оставшиеся от предыдущих тестов
+    """
+    return _reset_client_session(_auth_client_raw)
 
 
 @pytest.fixture
-def viewer_client(client, app):
+def viewer_client(_viewer_client_raw):
     """
     Фикстура для создания клиента с авторизованным пользователем-viewer
     Используется для тестирования ограничений доступа
     """
-    with app.app_context():
-        client.post('/login', data={
-            'username': 'viewer',
-            'password': 'Password123'
-        }, follow_redirects=True)
-
-    return client
+    return _reset_client_session(_viewer_client_raw)
 
 
 @pytest.fixture
-def admin_client(client, app):
+def admin_client(_admin_client_raw):
     """
     Фикстура для создания клиента с авторизованным администратором
     Используется для тестирования административных функций
     """
-    with app.app_context():
-        client.post('/login', data={
-            'username': 'admin',
-            'password': 'Password123'
-        }, follow_redirects=True)
-
-    return client
+    return _reset_client_session(_admin_client_raw)
 
 
 @pytest.fixture
-def sample_exercise(app):
+def get_flashes():
     """
-    Фикстура для создания тестового упражнения
-    Возвращает публичное упражнение доступное всем пользователям
+    Фикстура-функция для чтения flash-сообщений из сессии клиента
+    Позволяет проверять сообщения после редиректа без выполнения перехода по нему
     """
-    with app.app_context():
-        exercise = Exercise(
-            name='Тестовое упражнение',
-            description='Описание тестового упражнения для проверки функционала системы',
-            muscle_group='Грудь',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True
-        )
-        db.session.add(exercise)
-        db.session.commit()
+    def read(client):
+        with client.session_transaction() as sess:
+            return [message for _, message in sess.get('_flashes', [])]
 
-        # Возвращаем ID для использования в тестах
-        exercise_id = exercise.id
+    return read
 
-    return exercise_id
 
+@pytest.fixture(scope='session')
+def user_ids(_seed):
+    """
+    Фикстура для получения ID тестовых пользователей по имени (viewer, editor, admin)
+    Позволяет тестам не выполнять запрос пользователя по имени
+    """
+    return _seed['users']
 
-@pytest.fixture
-def sample_workout(app, sample_exercise):
+
+@pytest.fixture(scope='session')
+def editor_id(user_ids):
+    """
+    Фикстура для получения ID пользователя editor
+    """
+    return user_ids['editor']
+
+
+@pytest.fixture(scope='session')
+def sample_exercise(_seed):
+    """
+    Фикстура для получения тестового упражнения
+    Возвращает ID публичного упражнения доступного всем пользователям
+    """
+    return _seed['sample_exercise']
+
+
+@pytest.fixture(scope='module')
+def sample_workout(app, sample_exercise, editor_id):
     """
     Фикстура для создания тестовой тренировки
     Создаёт тренировку с упражнением для пользователя editor
+    Создаётся один раз на модуль до начала транзакции теста, изменения в тестах откатываются,
+    а сама тренировка удаляется после всех тестов модуля
     """
     with app.app_context():
-        # Получение пользователя editor для привязки тренировки
-        editor = User.query.filter_by(username='editor').first()
-
-        # Создание тренировки
+        # Создание тренировки с упражнением
         workout = Workout(
             date=date.today(),
             workout_type='Силовая',
             duration=60,
             notes='Тестовая тренировка для проверки функционала',
-            owner_id=editor.id
+            owner_id=editor_id
         )
-        db.session.add(workout)
-        db.session.commit()
-
-        # Добавление упражнения к тренировке
-        workout_exercise = WorkoutExercise(
-            workout_id=workout.id,
+        workout.workout_exercises.append(WorkoutExercise(
             exercise_id=sample_exercise,
             sets=3,
             reps=10,
             weight=50.0,
             order=1
-        )
-        db.session.add(workout_exercise)
+        ))
+        db.session.add(workout)
         db.session.commit()
 
         workout_id = workout.id
 
-    return workout_id
+    yield workout_id
+
+    # Удаление тренировки вместе с упражнениями тренировки (каскадное удаление)
+    with app.app_context():
+        db.session.delete(db.session.get(Workout, workout_id))
+        db.session.commit()
+
+
+@pytest.fixture
+def make_attachments():
+    """
+    Фикстура-фабрика для добавления записей о прикреплённых файлах
+    Все записи вставляются одним executemany без создания ORM объектов и фиксируются одним commit
+    Возвращает список ID созданных записей в порядке переданных данных
+    """
+    def make(rows, exercise_id=None, owner_id=None):
+        attachments = Attachment.__table__
+        params = [
+            {
+                'original_filename': row['filename'],
+                'mime_type': 'text/plain',
+                'exercise_id': exercise_id,
+                'owner_id': owner_id,
+                **row,
+            }
+            for row in rows
+        ]
+        attachment_ids = db.session.execute(
+            attachments.insert().returning(attachments.c.id, sort_by_parameter_order=True),
+            params
+        ).scalars().all()
+        db.session.commit()
+        return attachment_ids
+
+    return make
@@ -6,7 +6,7 @@ import pytest
 from models import db, User, Role
 
 
-def test_login_success(client, app):
+def test_login_success(client, app, get_flashes):
     """
     Тест успешного входа в систему с корректными учётными данными
     Проверяет что пользователь может войти в систему используя правильный логин и пароль
@@ -14,10 +14,13 @@ def test_login_success(client, app):
     response = client.post('/login', data={
         'username': 'editor',
         'password': 'Password123'
-    }, follow_redirects=True)
+    }, follow_redirects=False)
 
-    assert response.status_code == 200
-    assert 'Вы успешно вошли в систему' in response.get_data(as_text=True)
+    # Панель управления здесь не проверяется, поэтому редирект не выполняется,
+    # а flash-сообщение читается из сессии через фикстуру get_flashes
+    assert response.status_code == 302
+    assert '/dashboard' in response.location
+    assert any('Вы успешно вошли в систему' in message for message in get_flashes(client))
 
 
 def test_login_fail(client):
@@ -31,10 +34,10 @@ def test_login_fail(client):
     }, follow_redirects=True)
 
     assert response.status_code == 200
-    assert 'Неверное имя пользователя или пароль' in response.get_data(as_text=True)
+    assert 'Неверное имя пользователя или пароль'.encode() in response.data
 
 
-def test_register_success(client, app):
+def test_register_success(client, app, get_flashes):
     """
     Тест успешной регистрации нового пользователя в системе
     Проверяет что новый пользователь может зарегистрироваться с корректными данными
@@ -44,17 +47,17 @@ def test_register_success(client, app):
         'email': 'newuser@test.com',
         'password': 'NewPassword123',
         'confirm_password': 'NewPassword123'
-    }, follow_redirects=True)
+    }, follow_redirects=False)
 
-    assert response.status_code == 200
-    assert 'Регистрация прошла успешно' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert '/login' in response.location
+    assert any('Регистрация прошла успешно' in message for message in get_flashes(client))
 
     # Проверка что пользователь создан в базе данных
-    with app.app_context():
-        user = User.query.filter_by(username='newuser').first()
-        assert user is not None
-        assert user.email == 'newuser@test.com'
-        assert user.role.name == 'viewer'  # По умолчанию роль viewer
+    user = User.query.filter_by(username='newuser').first()
+    assert user is not None
+    assert user.email == 'newuser@test.com'
+    assert user.role.name == 'viewer'  # По умолчанию роль viewer
 
 
 def test_register_duplicate(client, app):
@@ -70,10 +73,10 @@ def test_register_duplicate(client, app):
     }, follow_redirects=True)
 
     assert response.status_code == 200
-    assert 'Пользователь с таким именем уже существует' in response.get_data(as_text=True)
+    assert 'Пользователь с таким именем уже существует'.encode() in response.data
 
 
-def test_logout(client):
+def test_logout(client, get_flashes):
     """
     Тест выхода пользователя из системы
     Проверяет что пользователь может успешно завершить сессию
@@ -82,13 +85,14 @@ def test_logout(client):
     client.post('/login', data={
         'username': 'editor',
         'password': 'Password123'
-    }, follow_redirects=True)
+    }, follow_redirects=False)
 
     # Выходим из системы
-    response = client.get('/logout', follow_redirects=True)
+    response = client.get('/logout', follow_redirects=False)
 
-    assert response.status_code == 200
-    assert 'Вы успешно вышли из системы' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert '/login' in response.location
+    assert any('Вы успешно вышли из системы' in message for message in get_flashes(client))
 
 
 def test_login_required(client):
@@ -116,7 +120,7 @@ def test_register_password_mismatch(client):
     }, follow_redirects=True)
 
     assert response.status_code == 200
-    assert 'Введённые пароли не совпадают' in response.get_data(as_text=True)
+    assert 'Введённые пароли не совпадают'.encode() in response.data
 
 
 def test_register_duplicate_email(client, app):
@@ -132,7 +136,7 @@ def test_register_duplicate_email(client, app):
     }, follow_redirects=True)
 
     assert response.status_code == 200
-    assert 'Пользователь с таким email уже зарегистрирован' in response.get_data(as_text=True)
+    assert 'Пользователь с таким email уже зарегистрирован'.encode() in response.data
 
 
 def test_dashboard_requires_login(client):
@@ -155,7 +159,7 @@ def test_authenticated_redirect_from_login(client):
     client.post('/login', data={
         'username': 'editor',
         'password': 'Password123'
-    }, follow_redirects=True)
+    }, follow_redirects=False)
 
     # Пытаемся снова зайти на страницу логина
     response = client.get('/login', follow_redirects=False)
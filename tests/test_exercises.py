@@ -3,7 +3,7 @@
 Проверяет функции просмотра создания редактирования удаления и фильтрации упражнений
 """
 import pytest
-from models import db, User, Exercise
+from models import db, Exercise
 
 
 def test_list_exercises(auth_client, sample_exercise):
@@ -14,10 +14,10 @@ def test_list_exercises(auth_client, sample_exercise):
     response = auth_client.get('/exercises/')
 
     assert response.status_code == 200
-    assert 'Тестовое упражнение' in response.get_data(as_text=True)
+    assert 'Тестовое упражнение'.encode() in response.data
 
 
-def test_create_exercise(auth_client, app):
+def test_create_exercise(auth_client, app, get_flashes):
     """
     Тест создания нового упражнения
     Проверяет что пользователь с правами editor может успешно создать новое упражнение в системе
@@ -29,41 +29,40 @@ def test_create_exercise(auth_client, app):
         'equipment': 'Гантели',
         'difficulty': 'intermediate',
         'is_public': 'on'
-    }, follow_redirects=True)
+    })
 
-    assert response.status_code == 200
-    assert 'Упражнение успешно добавлено' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert any('Упражнение успешно добавлено' in message for message in get_flashes(auth_client))
 
     # Проверка что упражнение создано в базе данных
-    with app.app_context():
-        exercise = Exercise.query.filter_by(name='Жим гантелей').first()
-        assert exercise is not None
-        assert exercise.muscle_group == 'Грудь'
-        assert exercise.equipment == 'Гантели'
-        assert exercise.difficulty == 'intermediate'
-        assert exercise.is_public == True
+    # После создания выполняется переход на страницу упражнения /exercises/<id>
+    exercise_id = int(response.location.rsplit('/', 1)[1])
+    exercise = db.session.get(Exercise, exercise_id)
+    assert exercise is not None
+    assert exercise.muscle_group == 'Грудь'
+    assert exercise.equipment == 'Гантели'
+    assert exercise.difficulty == 'intermediate'
+    assert exercise.is_public == True
 
 
-def test_edit_exercise(auth_client, app):
+def test_edit_exercise(auth_client, app, editor_id, get_flashes):
     """
     Тест редактирования существующего упражнения
     Проверяет что пользователь может изменить параметры существующего упражнения
     """
     # Создаём упражнение для редактирования
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-        exercise = Exercise(
-            name='Приседания',
-            description='Базовое упражнение для ног',
-            muscle_group='Ноги',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-        db.session.add(exercise)
-        db.session.commit()
-        exercise_id = exercise.id
+    exercise = Exercise(
+        name='Приседания',
+        description='Базовое упражнение для ног',
+        muscle_group='Ноги',
+        equipment='Штанга',
+        difficulty='intermediate',
+        is_public=True,
+        owner_id=editor_id
+    )
+    db.session.add(exercise)
+    db.session.commit()
+    exercise_id = exercise.id
 
     # Редактируем упражнение
     response = auth_client.post(f'/exercises/{exercise_id}/edit', data={
@@ -73,144 +72,104 @@ def test_edit_exercise(auth_client, app):
         'equipment': 'Штанга',
         'difficulty': 'advanced',
         'is_public': 'on'
-    }, follow_redirects=True)
+    })
 
-    assert response.status_code == 200
-    assert 'Изменения в упражнении успешно сохранены' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert any('Изменения в упражнении успешно сохранены' in message for message in get_flashes(auth_client))
 
     # Проверка что изменения сохранены
-    with app.app_context():
-        exercise = Exercise.query.get(exercise_id)
-        assert exercise.name == 'Приседания со штангой'
-        assert exercise.difficulty == 'advanced'
+    exercise = db.session.get(Exercise, exercise_id)
+    assert exercise.name == 'Приседания со штангой'
+    assert exercise.difficulty == 'advanced'
 
 
-def test_delete_exercise(auth_client, app):
+def test_delete_exercise(auth_client, app, editor_id, get_flashes):
     """
     Тест удаления упражнения из системы
     Проверяет что пользователь может удалить своё упражнение
     """
     # Создаём упражнение для удаления
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-        exercise = Exercise(
-            name='Упражнение для удаления',
-            description='Это упражнение будет удалено в тесте',
-            muscle_group='Пресс',
-            equipment='Без оборудования',
-            difficulty='beginner',
-            is_public=False,
-            owner_id=editor.id
-        )
-        db.session.add(exercise)
-        db.session.commit()
-        exercise_id = exercise.id
+    exercise = Exercise(
+        name='Упражнение для удаления',
+        description='Это упражнение будет удалено в тесте',
+        muscle_group='Пресс',
+        equipment='Без оборудования',
+        difficulty='beginner',
+        is_public=False,
+        owner_id=editor_id
+    )
+    db.session.add(exercise)
+    db.session.commit()
+    exercise_id = exercise.id
 
     # Удаляем упражнение
-    response = auth_client.post(f'/exercises/{exercise_id}/delete', follow_redirects=True)
+    response = auth_client.post(f'/exercises/{exercise_id}/delete')
 
-    assert response.status_code == 200
-    assert 'Упражнение успешно удалено' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert any('Упражнение успешно удалено' in message for message in get_flashes(auth_client))
 
     # Проверка что упражнение удалено из базы данных
-    with app.app_context():
-        exercise = Exercise.query.get(exercise_id)
-        assert exercise is None
+    exercise = db.session.get(Exercise, exercise_id)
+    assert exercise is None
 
 
-def test_search_exercises(auth_client, app):
+@pytest.fixture(scope='module')
+def filter_exercises(app, editor_id):
     """
-    Тест поиска упражнений по названию
-    Проверяет что функция поиска корректно фильтрует упражнения по введённому запросу
+    Фикстура с набором упражнений для проверки поиска и фильтров
+    Создаётся один раз на модуль до начала транзакции теста и удаляется после всех тестов модуля
     """
-    # Создаём несколько упражнений с разными названиями
     with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        exercise1 = Exercise(
-            name='Жим штанги лёжа',
-            description='Упражнение для груди',
-            muscle_group='Грудь',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        exercise2 = Exercise(
-            name='Жим гантелей сидя',
-            description='Упражнение для плеч',
-            muscle_group='Плечи',
-            equipment='Гантели',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        exercise3 = Exercise(
-            name='Подтягивания',
-            description='Упражнение для спины',
-            muscle_group='Спина',
-            equipment='Турник',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        db.session.add(exercise1)
-        db.session.add(exercise2)
-        db.session.add(exercise3)
+        exercises = [
+            Exercise(name='Жим штанги лёжа', description='Упражнение для груди',
+                     muscle_group='Грудь', equipment='Штанга', difficulty='intermediate',
+                     is_public=True, owner_id=editor_id),
+            Exercise(name='Жим гантелей сидя', description='Упражнение для плеч',
+                     muscle_group='Плечи', equipment='Гантели', difficulty='intermediate',
+                     is_public=True, owner_id=editor_id),
+            Exercise(name='Подтягивания', description='Упражнение для спины',
+                     muscle_group='Спина', equipment='Турник', difficulty='intermediate',
+                     is_public=True, owner_id=editor_id),
+            Exercise(name='Лёгкое упражнение', description='Для начинающих',
+                     muscle_group='Пресс', equipment='Без оборудования', difficulty='beginner',
+                     is_public=True, owner_id=editor_id),
+            Exercise(name='Сложное упражнение', description='Для продвинутых',
+                     muscle_group='Спина', equipment='Штанга', difficulty='advanced',
+                     is_public=True, owner_id=editor_id),
+        ]
+        db.session.add_all(exercises)
         db.session.commit()
+        exercise_ids = [exercise.id for exercise in exercises]
 
-    # Ищем упражнения со словом "жим"
-    response = auth_client.get('/exercises/?search=жим')
+    yield exercise_ids
 
-    assert response.status_code == 200
-    content = response.get_data(as_text=True)
-    assert 'Жим штанги лёжа' in content
-    assert 'Жим гантелей сидя' in content
-    assert 'Подтягивания' not in content
+    with app.app_context():
+        Exercise.query.filter(Exercise.id.in_(exercise_ids)).delete()
+        db.session.commit()
 
 
-def test_filter_by_muscle_group(auth_client, app):
+@pytest.mark.parametrize('query_string,expected,forbidden', [
+    # Поиск упражнений со словом "жим"
+    ('search=жим', ['Жим штанги лёжа', 'Жим гантелей сидя'], ['Подтягивания']),
+    # Фильтр по группе мышц "Грудь"
+    ('muscle_group=Грудь', ['Жим штанги лёжа'], ['Подтягивания']),
+    # Фильтр по уровню сложности beginner
+    ('difficulty=beginner', ['Лёгкое упражнение'], ['Сложное упражнение']),
+])
+def test_search_and_filter_exercises(auth_client, filter_exercises, query_string, expected, forbidden):
     """
-    Тест фильтрации упражнений по группе мышц
-    Проверяет что фильтр по группе мышц корректно отбирает упражнения
+    Тест поиска и фильтрации упражнений
+    Проверяет что поиск по названию и фильтры по группе мышц и уровню сложности
+    корректно отбирают упражнения
     """
-    # Создаём упражнения для разных групп мышц
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        exercise1 = Exercise(
-            name='Жим лёжа',
-            description='Для груди',
-            muscle_group='Грудь',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        exercise2 = Exercise(
-            name='Тяга штанги',
-            description='Для спины',
-            muscle_group='Спина',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        db.session.add(exercise1)
-        db.session.add(exercise2)
-        db.session.commit()
-
-    # Фильтруем по группе мышц "Грудь"
-    response = auth_client.get('/exercises/?muscle_group=Грудь')
+    response = auth_client.get(f'/exercises/?{query_string}')
 
     assert response.status_code == 200
-    content = response.get_data(as_text=True)
-    assert 'Жим лёжа' in content
+    content = response.data
+    for name in expected:
+        assert name.encode() in content
+    for name in forbidden:
+        assert name.encode() not in content
 
 
 def test_create_exercise_without_required_fields(auth_client):
@@ -226,7 +185,7 @@ def test_create_exercise_without_required_fields(auth_client):
     }, follow_redirects=True)
 
     assert response.status_code == 200
-    assert 'Необходимо указать название упражнения' in response.get_data(as_text=True)
+    assert 'Необходимо указать название упражнения'.encode() in response.data
 
 
 def test_view_exercise_detail(auth_client, sample_exercise):
@@ -237,83 +196,42 @@ def test_view_exercise_detail(auth_client, sample_exercise):
     response = auth_client.get(f'/exercises/{sample_exercise}')
 
     assert response.status_code == 200
-    assert 'Тестовое упражнение' in response.get_data(as_text=True)
+    assert 'Тестовое упражнение'.encode() in response.data
 
 
-def test_filter_by_difficulty(auth_client, app):
-    """
-    Тест фильтрации упражнений по уровню сложности
-    Проверяет что фильтр по уровню сложности корректно отбирает упражнения
-    """
-    # Создаём упражнения разной сложности
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        exercise1 = Exercise(
-            name='Лёгкое упражнение',
-            description='Для начинающих',
-            muscle_group='Пресс',
-            equipment='Без оборудования',
-            difficulty='beginner',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        exercise2 = Exercise(
-            name='Сложное упражнение',
-            description='Для продвинутых',
-            muscle_group='Спина',
-            equipment='Штанга',
-            difficulty='advanced',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        db.session.add(exercise1)
-        db.session.add(exercise2)
-        db.session.commit()
-
-    # Фильтруем по уровню сложности beginner
-    response = auth_client.get('/exercises/?difficulty=beginner')
-
-    assert response.status_code == 200
-    content = response.get_data(as_text=True)
-    assert 'Лёгкое упражнение' in content
-
-
-def test_pagination_exercises(auth_client, app):
+def test_pagination_exercises(auth_client, app, editor_id):
     """
     Тест пагинации списка упражнений
     Проверяет что пагинация работает корректно при большом количестве упражнений
     """
     # Создаём много упражнений для проверки пагинации
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        for i in range(15):
-            exercise = Exercise(
-                name=f'Упражнение {i}',
-                description=f'Описание упражнения {i}',
-                muscle_group='Грудь',
-                equipment='Штанга',
-                difficulty='intermediate',
-                is_public=True,
-                owner_id=editor.id
-            )
-            db.session.add(exercise)
-
-        db.session.commit()
-
-    # Проверяем первую страницу
-    response = auth_client.get('/exercises/?page=1')
-    assert response.status_code == 200
-
-    # Проверяем вторую страницу
+    # Строки вставляются одним executemany без создания ORM объектов
+    db.session.bulk_insert_mappings(Exercise, [
+        {
+            'name': f'Упражнение {i}',
+            'description': f'Описание упражнения {i}',
+            'muscle_group': 'Грудь',
+            'equipment': 'Штанга',
+            'difficulty': 'intermediate',
+            'is_public': True,
+            'owner_id': editor_id
+        }
+        for i in range(15)
+    ])
+    db.session.commit()
+
+    # Проверяем вторую страницу: на странице по 10 упражнений, список отсортирован
+    # от новых к старым, поэтому 10 из 15 созданных упражнений попадают на первую страницу
     response = auth_client.get('/exercises/?page=2')
     assert response.status_code == 200
+    assert 'Предыдущая страница'.encode() in response.data
 
+    created_on_page = [i for i in range(15)
+                       if f'<h3>Упражнение {i}</h3>'.encode() in response.data]
+    assert len(created_on_page) == 5
 
-def test_create_private_exercise(auth_client, app):
+
+def test_create_private_exercise(auth_client, app, get_flashes):
     """
     Тест создания приватного упражнения (не публичного)
     Проверяет что можно создать упражнение доступное только владельцу
@@ -325,12 +243,13 @@ def test_create_private_exercise(auth_client, app):
         'equipment': 'Гантели',
         'difficulty': 'intermediate'
         # Не передаём is_public
-    }, follow_redirects=True)
+    })
 
-    assert response.status_code == 200
-    assert 'Упражнение успешно добавлено' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert any('Упражнение успешно добавлено' in message for message in get_flashes(auth_client))
 
-    with app.app_context():
-        exercise = Exercise.query.filter_by(name='Приватное упражнение').first()
-        assert exercise is not None
-        assert exercise.is_public == False
+    # После создания выполняется переход на страницу упражнения /exercises/<id>
+    exercise_id = int(response.location.rsplit('/', 1)[1])
+    exercise = db.session.get(Exercise, exercise_id)
+    assert exercise is not None
+    assert exercise.is_public == False
@@ -3,261 +3,251 @@
 Проверяет загрузку выгрузку удаление файлов и экспорт в ZIP архив
 """
 import pytest
-from models import db, User, Exercise, Workout, WorkoutExercise, Attachment
+from models import db, Exercise, Workout, WorkoutExercise, Attachment
 import io
 import os
+import tempfile
 import zipfile
 import json
+from types import SimpleNamespace
+from sqlalchemy import event, func, select
 
+# Содержимое небольших файлов для тестов загрузки
+SMALL_FILE_CONTENT = b'test file content'
 
-def test_upload_valid_file(auth_client, app, sample_exercise):
+
+def small_file(filename):
+    """Данные формы для загрузки небольшого файла с указанным именем"""
+    return {'file': (io.BytesIO(SMALL_FILE_CONTENT), filename)}
+
+
+def response_as_zip(response):
+    """
+    Открытие ZIP архива из ответа приложения
+    Ответ читается по частям во временный файл, который хранится в памяти только до 4 МБ,
+    поэтому большой архив не копируется в память целиком
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=4 * 1024 * 1024)
+    for chunk in response.iter_encoded():
+        buffer.write(chunk)
+    buffer.seek(0)
+    return zipfile.ZipFile(buffer, 'r')
+
+
+class ZeroStream(io.RawIOBase):
+    """
+    Поток заданного размера из нулевых байтов для тестов ограничений размера файлов
+    Данные генерируются при чтении, поэтому большой файл не создаётся в памяти целиком
+    """
+
+    def __init__(self, size):
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self.remaining)
+        buffer[:size] = bytes(size)
+        self.remaining -= size
+        return size
+
+
+def test_upload_valid_file(auth_client, app, sample_exercise, get_flashes):
     """
     Тест загрузки валидного файла к упражнению
     Проверяет что система корректно принимает и сохраняет файл допустимого формата
     """
     # Создаём тестовый файл
-    data = {
-        'file': (io.BytesIO(b'test file content'), 'test.png')
-    }
+    data = small_file('test.png')
 
     response = auth_client.post(
         f'/exercises/{sample_exercise}/upload',
         data=data,
-        content_type='multipart/form-data',
-        follow_redirects=True
+        content_type='multipart/form-data'
     )
 
-    assert response.status_code == 200
-    assert 'успешно загружен' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert any('успешно загружен' in message for message in get_flashes(auth_client))
 
     # Проверка что файл добавлен в базу данных
-    with app.app_context():
-        attachment = Attachment.query.filter_by(exercise_id=sample_exercise).first()
-        assert attachment is not None
-        assert attachment.original_filename == 'test.png'
-
-
-def test_upload_invalid_extension(auth_client, sample_exercise):
+    # Загружается только имя файла, без создания ORM объекта
+    original_filename = db.session.scalars(
+        select(Attachment.original_filename).where(Attachment.exercise_id == sample_exercise)
+    ).first()
+    assert original_filename == 'test.png'
+
+
+@pytest.mark.parametrize('make_data,expected_text', [
+    # Файл с недопустимым расширением
+    (lambda: small_file('test.exe'),
+     'тип файла не поддерживается'),
+    # Файл размером больше 20 МБ: проверяется MAX_FILE_SIZE в представлении загрузки,
+    # так как в тестовом приложении ограничение MAX_CONTENT_LENGTH снято
+    (lambda: {'file': (ZeroStream(21 * 1024 * 1024), 'large_file.png')},  # 21 МБ
+     'Размер загружаемого файла слишком велик'),
+    # Запрос без файла
+    (lambda: {},
+     'Не удалось обнаружить файл'),
+], ids=['invalid_extension', 'too_large', 'without_file'])
+def test_upload_rejected(auth_client, sample_exercise, make_data, expected_text, get_flashes):
     """
-    Тест загрузки файла с недопустимым расширением
-    Проверяет что система отклоняет файлы неразрешённых типов
+    Тест отклонения некорректной загрузки файла
+    Проверяет что система отклоняет файлы неразрешённых типов, слишком большие файлы
+    и запросы без файла с соответствующим сообщением
+    Данные запроса создаются в самом тесте, поэтому большой файл не создаётся при сборе тестов
     """
-    # Создаём файл с недопустимым расширением
-    data = {
-        'file': (io.BytesIO(b'test content'), 'test.exe')
-    }
-
     response = auth_client.post(
         f'/exercises/{sample_exercise}/upload',
-        data=data,
-        content_type='multipart/form-data',
-        follow_redirects=True
+        data=make_data(),
+        content_type='multipart/form-data'
     )
 
-    assert response.status_code == 200
-    assert 'тип файла не поддерживается' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    assert any(expected_text in message for message in get_flashes(auth_client))
 
 
-def test_upload_too_large(auth_client, sample_exercise):
+def test_total_size_limit(auth_client, app, sample_exercise, editor_id, make_attachments, get_flashes):
     """
-    Тест загрузки файла превышающего максимально допустимый размер
-    Проверяет что система отклоняет слишком большие файлы
+    Тест проверки суммарного лимита размера файлов на объект
+    Проверяет что система контролирует общий объём прикреплённых файлов
     """
-    # Создаём файл размером больше 20 МБ
-    large_content = b'x' * (21 * 1024 * 1024)  # 21 МБ
+    # Создаём запись о файле размером 90 МБ в базе данных, чтобы приблизиться к лимиту
+    make_attachments([{
+        'filename': 'existing_large.png',
+        'file_path': '/tmp/existing_large.png',
+        'file_size': 90 * 1024 * 1024,  # 90 МБ
+        'mime_type': 'image/png',
+    }], exercise_id=sample_exercise, owner_id=editor_id)
+
+    # Пытаемся загрузить файл размером 15 МБ: он проходит проверку размера одного файла (20 МБ),
+    # но вместе с уже прикреплёнными превышает суммарный лимит 100 МБ
     data = {
-        'file': (io.BytesIO(large_content), 'large_file.png')
+        'file': (ZeroStream(15 * 1024 * 1024), 'another_file.png')  # 15 МБ
     }
 
     response = auth_client.post(
         f'/exercises/{sample_exercise}/upload',
         data=data,
-        content_type='multipart/form-data',
-        follow_redirects=True
+        content_type='multipart/form-data'
     )
 
-    assert response.status_code == 200
-    assert 'Размер загружаемого файла слишком велик' in response.get_data(as_text=True)
+    assert response.status_code == 302
+    # Должно быть сообщение о превышении суммарного лимита
+    assert any('суммарный размер' in message.lower() for message in get_flashes(auth_client))
 
 
-def test_total_size_limit(auth_client, app, sample_exercise):
+@pytest.fixture(scope='module')
+def exported_workout_zip(module_auth_client, sample_workout):
     """
-    Тест проверки суммарного лимита размера файлов на объект
-    Проверяет что система контролирует общий объём прикреплённых файлов
+    Фикстура с результатом экспорта тестовой тренировки в ZIP архив
+    Экспорт выполняется один раз на модуль для тестов которые не изменяют данные тренировки
     """
-    # Загружаем несколько файлов чтобы приблизиться к лимиту
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        # Создаём файл размером 80 МБ в базе данных
-        attachment = Attachment(
-            filename='existing_large.png',
-            original_filename='existing_large.png',
-            file_path='/tmp/existing_large.png',
-            file_size=80 * 1024 * 1024,  # 80 МБ
-            mime_type='image/png',
-            exercise_id=sample_exercise,
-            owner_id=editor.id
-        )
-        db.session.add(attachment)
-        db.session.commit()
-
-    # Пытаемся загрузить ещё один большой файл (25 МБ)
-    # Это превысит лимит 100 МБ
-    content = b'x' * (25 * 1024 * 1024)  # Изменено на 25 МБ чтобы превысить лимит
-    data = {
-        'file': (io.BytesIO(content), 'another_file.png')
-    }
+    response = module_auth_client.get(f'/workouts/{sample_workout}/export_zip')
 
-    response = auth_client.post(
-        f'/exercises/{sample_exercise}/upload',
-        data=data,
-        content_type='multipart/form-data',
-        follow_redirects=True
-    )
+    with response_as_zip(response) as zip_file:
+        names = frozenset(zip_file.namelist())
+        workout_data = json.loads(zip_file.read('workout.json').decode('utf-8'))
 
-    assert response.status_code == 200
-    # Должно быть сообщение о превышении лимита
-    content_text = response.get_data(as_text=True)
-    assert 'суммарный размер' in content_text.lower() or 'превышает' in content_text.lower()
+    return SimpleNamespace(response=response, names=names, workout=workout_data)
 
 
-def test_zip_export(auth_client, app, sample_workout):
+def test_zip_export(exported_workout_zip):
     """
     Тест экспорта тренировки в ZIP архив
     Проверяет что система корректно создаёт ZIP файл с данными тренировки
     """
-    response = auth_client.get(f'/workouts/{sample_workout}/export_zip')
+    response = exported_workout_zip.response
 
     assert response.status_code == 200
     assert response.headers['Content-Type'] == 'application/zip'
     assert 'attachment' in response.headers['Content-Disposition']
 
 
-def test_zip_contains_json(auth_client, app, sample_workout):
+def test_zip_contains_json(exported_workout_zip):
     """
     Тест наличия workout.json в ZIP архиве
     Проверяет что ZIP архив содержит файл с метаданными тренировки в формате JSON
     """
-    response = auth_client.get(f'/workouts/{sample_workout}/export_zip')
-
-    # Читаем содержимое ZIP
-    zip_data = io.BytesIO(response.data)
-    with zipfile.ZipFile(zip_data, 'r') as zip_file:
-        # Проверяем наличие workout.json
-        assert 'workout.json' in zip_file.namelist()
-
-        # Читаем и парсим JSON
-        json_content = zip_file.read('workout.json').decode('utf-8')
-        workout_data = json.loads(json_content)
+    # Проверяем наличие workout.json
+    assert 'workout.json' in exported_workout_zip.names
 
-        # Проверяем структуру JSON
-        assert 'id' in workout_data
-        assert 'date' in workout_data
-        assert 'workout_type' in workout_data
-        assert 'exercises' in workout_data
-        assert isinstance(workout_data['exercises'], list)
+    # Проверяем структуру JSON
+    workout_data = exported_workout_zip.workout
+    assert 'id' in workout_data
+    assert 'date' in workout_data
+    assert 'workout_type' in workout_data
+    assert 'exercises' in workout_data
+    assert isinstance(workout_data['exercises'], list)
 
 
-def test_zip_contains_attachments(auth_client, app, sample_workout):
+def test_zip_contains_attachments(auth_client, app, sample_workout, editor_id, make_attachments):
     """
     Тест наличия прикреплённых файлов в ZIP архиве
     Проверяет что все файлы упражнений включены в архив
     """
     # Добавляем файл к упражнению
-    with app.app_context():
-        workout = Workout.query.get(sample_workout)
-        exercise_id = workout.workout_exercises[0].exercise_id
-        editor = User.query.filter_by(username='editor').first()
-
-        # Создаём временный файл
-        upload_folder = app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
-        test_file_path = os.path.join(upload_folder, 'test_attachment.txt')
-
-        with open(test_file_path, 'w') as f:
-            f.write('Test attachment content')
-
-        # Добавляем запись в БД
-        attachment = Attachment(
-            filename='test_attachment.txt',
-            original_filename='test_attachment.txt',
-            file_path=test_file_path,
-            file_size=100,
-            mime_type='text/plain',
-            exercise_id=exercise_id,
-            owner_id=editor.id
-        )
-        db.session.add(attachment)
-        db.session.commit()
+    workout = db.session.get(Workout, sample_workout)
+    exercise_id = workout.workout_exercises[0].exercise_id
+
+    # Создаём временный файл
+    upload_folder = app.config['UPLOAD_FOLDER']
+    test_file_path = os.path.join(upload_folder, 'test_attachment.txt')
+
+    with open(test_file_path, 'w') as f:
+        f.write('Test attachment content')
+
+    # Добавляем запись в БД
+    make_attachments([{
+        'filename': 'test_attachment.txt',
+        'file_path': test_file_path,
+        'file_size': 100,
+    }], exercise_id=exercise_id, owner_id=editor_id)
 
     # Экспортируем тренировку
     response = auth_client.get(f'/workouts/{sample_workout}/export_zip')
 
     # Проверяем ZIP архив
-    zip_data = io.BytesIO(response.data)
-    with zipfile.ZipFile(zip_data, 'r') as zip_file:
+    with response_as_zip(response) as zip_file:
         # Проверяем наличие папки attachments
         attachment_files = [name for name in zip_file.namelist() if name.startswith('attachments/')]
         assert len(attachment_files) > 0
 
+        # Файлы сохраняются без сжатия, сжимается только JSON с метаданными
+        assert zip_file.getinfo('workout.json').compress_type == zipfile.ZIP_DEFLATED
+        for name in attachment_files:
+            assert zip_file.getinfo(name).compress_type == zipfile.ZIP_STORED
 
-def test_delete_file(auth_client, app, sample_exercise):
+
+def test_delete_file(auth_client, app, sample_exercise, editor_id, make_attachments, get_flashes):
     """
     Тест удаления прикреплённого файла
     Проверяет что пользователь может удалить свой файл из системы
     """
-    # Создаём файл для удаления
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        # Создаём временный файл
-        upload_folder = app.config['UPLOAD_FOLDER']
-        os.makedirs(upload_folder, exist_ok=True)
-        test_file_path = os.path.join(upload_folder, 'file_to_delete.txt')
-
-        with open(test_file_path, 'w') as f:
-            f.write('This file will be deleted')
-
-        # Добавляем в БД
-        attachment = Attachment(
-            filename='file_to_delete.txt',
-            original_filename='file_to_delete.txt',
-            file_path=test_file_path,
-            file_size=100,
-            mime_type='text/plain',
-            exercise_id=sample_exercise,
-            owner_id=editor.id
-        )
-        db.session.add(attachment)
-        db.session.commit()
-        attachment_id = attachment.id
-
-    # Удаляем файл
-    response = auth_client.post(f'/files/{attachment_id}/delete', follow_redirects=True)
+    # Создаём временный файл для удаления
+    upload_folder = app.config['UPLOAD_FOLDER']
+    test_file_path = os.path.join(upload_folder, 'file_to_delete.txt')
 
-    assert response.status_code == 200
-    assert 'успешно удалён' in response.get_data(as_text=True)
+    with open(test_file_path, 'w') as f:
+        f.write('This file will be deleted')
 
-    # Проверяем что файл удалён из БД
-    with app.app_context():
-        attachment = Attachment.query.get(attachment_id)
-        assert attachment is None
+    # Добавляем в БД
+    attachment_id, = make_attachments([{
+        'filename': 'file_to_delete.txt',
+        'file_path': test_file_path,
+        'file_size': 100,
+    }], exercise_id=sample_exercise, owner_id=editor_id)
 
+    # Удаляем файл
+    response = auth_client.post(f'/files/{attachment_id}/delete')
 
-def test_upload_without_file(auth_client, sample_exercise):
-    """
-    Тест попытки загрузки без выбора файла
-    Проверяет что система корректно обрабатывает пустой запрос на загрузку
-    """
-    response = auth_client.post(
-        f'/exercises/{sample_exercise}/upload',
-        data={},
-        follow_redirects=True
-    )
+    assert response.status_code == 302
+    assert any('успешно удалён' in message for message in get_flashes(auth_client))
 
-    assert response.status_code == 200
-    assert 'файл' in response.get_data(as_text=True).lower()
+    # Проверяем что файл удалён из БД
+    assert db.session.scalar(
+        select(func.count()).select_from(Attachment).where(Attachment.id == attachment_id)
+    ) == 0
 
 
 def test_exercise_export_to_zip(auth_client, app, sample_exercise):
@@ -272,8 +262,7 @@ def test_exercise_export_to_zip(auth_client, app, sample_exercise):
     assert 'attachment' in response.headers['Content-Disposition']
 
     # Проверяем содержимое ZIP
-    zip_data = io.BytesIO(response.data)
-    with zipfile.ZipFile(zip_data, 'r') as zip_file:
+    with response_as_zip(response) as zip_file:
         # Должен быть exercise.json
         assert 'exercise.json' in zip_file.namelist()
 
@@ -292,33 +281,27 @@ def test_upload_multiple_files(auth_client, app, sample_exercise):
     Проверяет что можно прикрепить несколько файлов к одному упражнению
     """
     # Загружаем первый файл
-    data1 = {
-        'file': (io.BytesIO(b'first file'), 'file1.txt')
-    }
+    data1 = small_file('file1.txt')
     response1 = auth_client.post(
         f'/exercises/{sample_exercise}/upload',
         data=data1,
-        content_type='multipart/form-data',
-        follow_redirects=True
+        content_type='multipart/form-data'
     )
-    assert response1.status_code == 200
+    assert response1.status_code == 302
 
     # Загружаем второй файл
-    data2 = {
-        'file': (io.BytesIO(b'second file'), 'file2.txt')
-    }
+    data2 = small_file('file2.txt')
     response2 = auth_client.post(
         f'/exercises/{sample_exercise}/upload',
         data=data2,
-        content_type='multipart/form-data',
-        follow_redirects=True
+        content_type='multipart/form-data'
     )
-    assert response2.status_code == 200
+    assert response2.status_code == 302
 
     # Проверяем что оба файла в БД
-    with app.app_context():
-        attachments = Attachment.query.filter_by(exercise_id=sample_exercise).all()
-        assert len(attachments) >= 2
+    assert db.session.scalar(
+        select(func.count()).select_from(Attachment).where(Attachment.exercise_id == sample_exercise)
+    ) >= 2
 
 
 def test_upload_file_to_nonexistent_exercise(auth_client):
@@ -326,9 +309,7 @@ def test_upload_file_to_nonexistent_exercise(auth_client):
     Тест загрузки файла к несуществующему упражнению
     Проверяет что система корректно обрабатывает ошибку 404
     """
-    data = {
-        'file': (io.BytesIO(b'test'), 'test.txt')
-    }
+    data = small_file('test.txt')
 
     response = auth_client.post(
         '/exercises/99999/upload',
@@ -341,37 +322,71 @@ def test_upload_file_to_nonexistent_exercise(auth_client):
     assert response.status_code == 404
 
 
-def test_json_export_structure(auth_client, app, sample_workout):
+def test_json_export_structure(exported_workout_zip):
     """
     Тест структуры JSON данных в экспортируемом архиве
     Проверяет что JSON содержит все необходимые поля с корректными данными
     """
-    response = auth_client.get(f'/workouts/{sample_workout}/export_zip')
+    workout_data = exported_workout_zip.workout
+
+    # Проверяем обязательные поля
+    assert 'id' in workout_data
+    assert 'date' in workout_data
+    assert 'workout_type' in workout_data
+    assert 'duration' in workout_data
+    assert 'owner' in workout_data
+    assert 'exercises' in workout_data
+
+    # Проверяем структуру owner
+    assert 'id' in workout_data['owner']
+    assert 'username' in workout_data['owner']
+
+    # Проверяем что exercises это список
+    assert isinstance(workout_data['exercises'], list)
+
+    # Если есть упражнения проверяем их структуру
+    if len(workout_data['exercises']) > 0:
+        exercise = workout_data['exercises'][0]
+        assert 'exercise_id' in exercise
+        assert 'name' in exercise
+        assert 'sets' in exercise
+        assert 'reps' in exercise
+
+
+def test_zip_export_query_count(auth_client, app, editor_id, sample_workout, make_attachments):
+    """
+    Тест количества запросов к базе данных при экспорте тренировки
+    Проверяет что файлы всех упражнений тренировки загружаются одним запросом
+    """
+    # Добавляем в тренировку несколько упражнений с файлами
+    attachment_rows = []
+    for i in range(3):
+        exercise = Exercise(name=f'Упражнение с файлом {i}', muscle_group='Спина',
+                            is_public=True, owner_id=editor_id)
+        db.session.add(exercise)
+        db.session.flush()
+        db.session.add(WorkoutExercise(workout_id=sample_workout, exercise_id=exercise.id,
+                                       sets=3, reps=10, order=i + 2))
+        attachment_rows.append({'filename': f'file_{i}.txt', 'file_path': f'/nonexistent/file_{i}.txt',
+                                'file_size': 100, 'exercise_id': exercise.id})
+    make_attachments(attachment_rows, owner_id=editor_id)
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count_statement)
+    try:
+        response = auth_client.get(f'/workouts/{sample_workout}/export_zip')
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_statement)
+
+    assert response.status_code == 200
+    assert len([s for s in statements if 'FROM attachments' in s]) == 1
+
+    with response_as_zip(response) as zip_file:
+        workout_data = json.loads(zip_file.read('workout.json').decode('utf-8'))
 
-    zip_data = io.BytesIO(response.data)
-    with zipfile.ZipFile(zip_data, 'r') as zip_file:
-        json_content = zip_file.read('workout.json').decode('utf-8')
-        workout_data = json.loads(json_content)
-
-        # Проверяем обязательные поля
-        assert 'id' in workout_data
-        assert 'date' in workout_data
-        assert 'workout_type' in workout_data
-        assert 'duration' in workout_data
-        assert 'owner' in workout_data
-        assert 'exercises' in workout_data
-
-        # Проверяем структуру owner
-        assert 'id' in workout_data['owner']
-        assert 'username' in workout_data['owner']
-
-        # Проверяем что exercises это список
-        assert isinstance(workout_data['exercises'], list)
-
-        # Если есть упражнения проверяем их структуру
-        if len(workout_data['exercises']) > 0:
-            exercise = workout_data['exercises'][0]
-            assert 'exercise_id' in exercise
-            assert 'name' in exercise
-            assert 'sets' in exercise
-            assert 'reps' in exercise
+    attachments = [name for exercise in workout_data['exercises'] for name in exercise['attachments']]
+    assert sorted(attachments) == ['file_0.txt', 'file_1.txt', 'file_2.txt']
@@ -3,12 +3,30 @@
 Проверяет корректность генерации отчётов по объёму тренировок и личным рекордам
 """
 import pytest
-from models import db, User, Exercise, Workout, WorkoutExercise
+from models import db, Exercise, Workout, WorkoutExercise
 from datetime import date, timedelta
+from sqlalchemy import delete, select
 import csv
 import io
 
 
+def delete_workouts(owner_id):
+    """
+    Удаление всех тренировок пользователя двумя массовыми DELETE без загрузки ORM объектов
+    Упражнения тренировок удаляются первыми, так как внешний ключ не объявлен с ON DELETE CASCADE
+    """
+    owner_workouts = select(Workout.id).where(Workout.owner_id == owner_id)
+    db.session.execute(
+        delete(WorkoutExercise).where(WorkoutExercise.workout_id.in_(owner_workouts)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        delete(Workout).where(Workout.owner_id == owner_id),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+
+
 def test_volume_report(auth_client, app, sample_workout):
     """
     Тест отчёта по объёму тренировок за период
@@ -17,8 +35,8 @@ def test_volume_report(auth_client, app, sample_workout):
     response = auth_client.get('/reports/volume')
 
     assert response.status_code == 200
-    content = response.get_data(as_text=True)
-    assert 'Объём тренировок' in content or 'Силовая' in content
+    content = response.data
+    assert 'Объём тренировок'.encode() in content or 'Силовая'.encode() in content
 
 
 def test_volume_csv_export(auth_client, app, sample_workout):
@@ -33,43 +51,36 @@ def test_volume_csv_export(auth_client, app, sample_workout):
     assert 'attachment' in response.headers['Content-Disposition']
 
     # Проверка содержимого CSV
-    content = response.get_data(as_text=True)
-    assert 'Тип тренировки' in content
-    assert 'Количество тренировок' in content
+    content = response.data
+    assert 'Тип тренировки'.encode() in content
+    assert 'Количество тренировок'.encode() in content
 
 
-def test_volume_csv_structure(auth_client, app):
+def test_volume_csv_structure(auth_client, app, user_ids):
     """
     Тест структуры CSV файла отчёта по объёму
     Проверяет что CSV содержит правильные колонки и формат данных
     """
     # Создаём тестовые тренировки
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-        exercise = Exercise.query.first()
-
-        # Создаём тренировку
-        workout = Workout(
-            date=date.today(),
-            workout_type='Кардио',
-            duration=45,
-            notes='Тестовая кардио тренировка',
-            owner_id=editor.id
-        )
-        db.session.add(workout)
-        db.session.commit()
-
-        # Добавляем упражнение
-        we = WorkoutExercise(
-            workout_id=workout.id,
+    exercise = Exercise.query.first()
+
+    # Создаём тренировку с упражнением, которое сохраняется вместе с ней через связь
+    workout = Workout(
+        date=date.today(),
+        workout_type='Кардио',
+        duration=45,
+        notes='Тестовая кардио тренировка',
+        owner_id=user_ids['editor'],
+        workout_exercises=[WorkoutExercise(
             exercise_id=exercise.id,
             sets=3,
             reps=15,
             weight=None,
             duration=1800
-        )
-        db.session.add(we)
-        db.session.commit()
+        )]
+    )
+    db.session.add(workout)
+    db.session.commit()
 
     # Получаем CSV
     response = auth_client.get('/reports/volume/export')
@@ -97,8 +108,8 @@ def test_records_report(auth_client, app, sample_workout):
     response = auth_client.get('/reports/records')
 
     assert response.status_code == 200
-    content = response.get_data(as_text=True)
-    assert 'личных рекордов' in content or 'Динамика' in content
+    content = response.data
+    assert 'личных рекордов'.encode() in content or 'Динамика'.encode() in content
 
 
 def test_records_csv_export(auth_client, app, sample_workout):
@@ -113,42 +124,40 @@ def test_records_csv_export(auth_client, app, sample_workout):
     assert 'attachment' in response.headers['Content-Disposition']
 
     # Проверка содержимого
-    content = response.get_data(as_text=True)
-    assert 'Дата' in content
-    assert 'Упражнение' in content
-    assert 'Макс вес' in content
+    content = response.data
+    assert 'Дата'.encode() in content
+    assert 'Упражнение'.encode() in content
+    assert 'Макс вес'.encode() in content
 
 
-def test_volume_report_with_date_filter(auth_client, app):
+def test_volume_report_with_date_filter(auth_client, app, user_ids):
     """
     Тест отчёта по объёму с фильтрацией по датам
     Проверяет что отчёт корректно применяет фильтры по периоду времени
     """
     # Создаём тренировки в разные даты
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-        exercise = Exercise.query.first()
-
-        # Старая тренировка
-        old_workout = Workout(
-            date=date.today() - timedelta(days=60),
-            workout_type='Силовая',
-            duration=60,
-            notes='Старая тренировка',
-            owner_id=editor.id
-        )
-        db.session.add(old_workout)
-
-        # Новая тренировка
-        new_workout = Workout(
-            date=date.today(),
-            workout_type='Силовая',
-            duration=45,
-            notes='Новая тренировка',
-            owner_id=editor.id
-        )
-        db.session.add(new_workout)
-        db.session.commit()
+    exercise = Exercise.query.first()
+
+    # Старая тренировка
+    old_workout = Workout(
+        date=date.today() - timedelta(days=60),
+        workout_type='Силовая',
+        duration=60,
+        notes='Старая тренировка',
+        owner_id=user_ids['editor']
+    )
+
+    # Новая тренировка
+    new_workout = Workout(
+        date=date.today(),
+        workout_type='Силовая',
+        duration=45,
+        notes='Новая тренировка',
+        owner_id=user_ids['editor']
+    )
+
+    db.session.add_all([old_workout, new_workout])
+    db.session.commit()
 
     # Запрашиваем отчёт за последние 30 дней
     date_from = (date.today() - timedelta(days=30)).strftime('%Y-%m-%d')
@@ -159,211 +168,183 @@ def test_volume_report_with_date_filter(auth_client, app):
     assert response.status_code == 200
 
 
-def test_records_report_with_exercise_filter(auth_client, app):
+def test_records_report_with_exercise_filter(auth_client, app, user_ids):
     """
     Тест отчёта по рекордам с фильтрацией по упражнению
     Проверяет что можно отфильтровать рекорды по конкретному упражнению
     """
     # Создаём тренировки с разными упражнениями
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        # Создаём два упражнения
-        exercise1 = Exercise(
-            name='Жим лёжа',
-            description='Упражнение 1',
-            muscle_group='Грудь',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        exercise2 = Exercise(
-            name='Приседания',
-            description='Упражнение 2',
-            muscle_group='Ноги',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-
-        db.session.add(exercise1)
-        db.session.add(exercise2)
-        db.session.commit()
-
-        # Создаём тренировку с первым упражнением
-        workout = Workout(
-            date=date.today(),
-            workout_type='Силовая',
-            duration=60,
-            owner_id=editor.id
-        )
-        db.session.add(workout)
-        db.session.commit()
-
-        we = WorkoutExercise(
-            workout_id=workout.id,
-            exercise_id=exercise1.id,
+
+    # Создаём два упражнения
+    exercise1 = Exercise(
+        name='Жим лёжа',
+        description='Упражнение 1',
+        muscle_group='Грудь',
+        equipment='Штанга',
+        difficulty='intermediate',
+        is_public=True,
+        owner_id=user_ids['editor']
+    )
+
+    exercise2 = Exercise(
+        name='Приседания',
+        description='Упражнение 2',
+        muscle_group='Ноги',
+        equipment='Штанга',
+        difficulty='intermediate',
+        is_public=True,
+        owner_id=user_ids['editor']
+    )
+
+    # Создаём тренировку с первым упражнением
+    workout = Workout(
+        date=date.today(),
+        workout_type='Силовая',
+        duration=60,
+        owner_id=user_ids['editor'],
+        workout_exercises=[WorkoutExercise(
+            exercise=exercise1,
             sets=3,
             reps=10,
             weight=100.0
-        )
-        db.session.add(we)
-        db.session.commit()
+        )]
+    )
+
+    # Все объекты сохраняются одной фиксацией транзакции
+    db.session.add_all([exercise1, exercise2, workout])
+    db.session.commit()
 
-        exercise1_id = exercise1.id
+    exercise1_id = exercise1.id
 
     # Запрашиваем отчёт по конкретному упражнению
     response = auth_client.get(f'/reports/records?exercise_id={exercise1_id}')
 
     assert response.status_code == 200
-    content = response.get_data(as_text=True)
-    assert 'Жим лёжа' in content
+    content = response.data
+    assert 'Жим лёжа'.encode() in content
 
 
-def test_volume_report_calculation(auth_client, app):
+def test_volume_report_calculation(auth_client, app, user_ids):
     """
     Тест корректности расчётов в отчёте по объёму
     Проверяет что формулы агрегации данных работают правильно
     """
     # Создаём тренировки с точными параметрами для проверки расчётов
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-        exercise = Exercise.query.first()
-
-        # Первая тренировка
-        workout1 = Workout(
-            date=date.today(),
-            workout_type='Тестовая',
-            duration=30,
-            owner_id=editor.id
-        )
-        db.session.add(workout1)
-        db.session.commit()
-
-        we1 = WorkoutExercise(
-            workout_id=workout1.id,
-            exercise_id=exercise.id,
-            sets=3,
-            reps=10,
-            weight=50.0
-        )
-        db.session.add(we1)
-
-        # Вторая тренировка
-        workout2 = Workout(
-            date=date.today(),
-            workout_type='Тестовая',
-            duration=40,
-            owner_id=editor.id
-        )
-        db.session.add(workout2)
-        db.session.commit()
-
-        we2 = WorkoutExercise(
-            workout_id=workout2.id,
-            exercise_id=exercise.id,
-            sets=4,
-            reps=8,
-            weight=60.0
-        )
-        db.session.add(we2)
-
-        db.session.commit()
+    exercise = Exercise.query.first()
+
+    # Первая тренировка
+    workout1 = Workout(
+        date=date.today(),
+        workout_type='Тестовая',
+        duration=30,
+        owner_id=user_ids['editor']
+    )
+
+    # Вторая тренировка
+    workout2 = Workout(
+        date=date.today(),
+        workout_type='Тестовая',
+        duration=40,
+        owner_id=user_ids['editor']
+    )
+
+    db.session.add_all([workout1, workout2])
+    db.session.flush()
+
+    # Упражнения нужны только для агрегатов отчёта, поэтому вставляются одним executemany без создания ORM объектов
+    db.session.bulk_insert_mappings(WorkoutExercise, [
+        {'workout_id': workout1.id, 'exercise_id': exercise.id, 'sets': 3, 'reps': 10, 'weight': 50.0},
+        {'workout_id': workout2.id, 'exercise_id': exercise.id, 'sets': 4, 'reps': 8, 'weight': 60.0},
+    ])
+    db.session.commit()
 
     # Получаем отчёт
     response = auth_client.get('/reports/volume')
 
     assert response.status_code == 200
-    content = response.get_data(as_text=True)
+    content = response.data
 
     # Проверяем что данные присутствуют
-    assert 'Тестовая' in content
+    assert 'Тестовая'.encode() in content
+
+    # Проверяем агрегированные значения в CSV: 2 тренировки, 30 + 40 минут,
+    # 3×10 + 4×8 упражнений и 3×10×50 + 4×8×60 кг
+    response = auth_client.get('/reports/volume/export')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True).replace('\ufeff', '')), delimiter=';'))
+    assert ['Тестовая', '2', '70', '62', '3420.0'] in rows
 
 
-def test_records_report_max_weight(auth_client, app):
+def test_records_report_max_weight(auth_client, app, user_ids):
     """
     Тест определения максимального веса в отчёте по рекордам
     Проверяет что система правильно находит максимальный вес по упражнению
     """
     # Создаём несколько подходов с разным весом
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-
-        exercise = Exercise(
-            name='Тестовое упражнение для рекорда',
-            description='Для проверки макс веса',
-            muscle_group='Грудь',
-            equipment='Штанга',
-            difficulty='intermediate',
-            is_public=True,
-            owner_id=editor.id
-        )
-        db.session.add(exercise)
-        db.session.commit()
-
-        # Тренировка с весом 80 кг
-        workout1 = Workout(
-            date=date.today() - timedelta(days=5),
-            workout_type='Силовая',
-            duration=60,
-            owner_id=editor.id
-        )
-        db.session.add(workout1)
-        db.session.commit()
-
-        we1 = WorkoutExercise(
-            workout_id=workout1.id,
-            exercise_id=exercise.id,
+
+    exercise = Exercise(
+        name='Тестовое упражнение для рекорда',
+        description='Для проверки макс веса',
+        muscle_group='Грудь',
+        equipment='Штанга',
+        difficulty='intermediate',
+        is_public=True,
+        owner_id=user_ids['editor']
+    )
+
+    # Тренировка с весом 80 кг
+    workout1 = Workout(
+        date=date.today() - timedelta(days=5),
+        workout_type='Силовая',
+        duration=60,
+        owner_id=user_ids['editor'],
+        workout_exercises=[WorkoutExercise(
+            exercise=exercise,
             sets=3,
             reps=10,
             weight=80.0
-        )
-        db.session.add(we1)
-
-        # Тренировка с весом 100 кг (это максимум)
-        workout2 = Workout(
-            date=date.today(),
-            workout_type='Силовая',
-            duration=60,
-            owner_id=editor.id
-        )
-        db.session.add(workout2)
-        db.session.commit()
-
-        we2 = WorkoutExercise(
-            workout_id=workout2.id,
-            exercise_id=exercise.id,
+        )]
+    )
+
+    # Тренировка с весом 100 кг (это максимум)
+    workout2 = Workout(
+        date=date.today(),
+        workout_type='Силовая',
+        duration=60,
+        owner_id=user_ids['editor'],
+        workout_exercises=[WorkoutExercise(
+            exercise=exercise,
             sets=3,
             reps=8,
             weight=100.0
-        )
-        db.session.add(we2)
+        )]
+    )
 
-        db.session.commit()
+    # Все объекты сохраняются одной фиксацией транзакции
+    db.session.add_all([exercise, workout1, workout2])
+    db.session.commit()
 
     # Получаем отчёт
     response = auth_client.get('/reports/records')
 
     assert response.status_code == 200
-    content = response.get_data(as_text=True)
+    content = response.data
 
     # Проверяем что упражнение есть в отчёте
-    assert 'Тестовое упражнение для рекорда' in content
+    assert 'Тестовое упражнение для рекорда'.encode() in content
+
+    # Проверяем что в CSV попало выполнение с максимальным весом
+    response = auth_client.get(f'/reports/records/export?exercise_id={exercise.id}')
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True).replace('\ufeff', '')), delimiter=';'))
+    assert rows[1:] == [[date.today().strftime('%d.%m.%Y'), 'Тестовое упражнение для рекорда', '100.0', '3', '8']]
 
 
-def test_empty_volume_report(auth_client, app):
+def test_empty_volume_report(auth_client, app, user_ids):
     """
     Тест отчёта по объёму при отсутствии данных
     Проверяет что система корректно обрабатывает ситуацию когда у пользователя нет тренировок
     """
     # Удаляем все тренировки пользователя
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-        Workout.query.filter_by(owner_id=editor.id).delete()
-        db.session.commit()
+    delete_workouts(user_ids['editor'])
 
     response = auth_client.get('/reports/volume')
 
@@ -371,16 +352,13 @@ def test_empty_volume_report(auth_client, app):
     # Отчёт должен загрузиться даже без данных
 
 
-def test_empty_records_report(auth_client, app):
+def test_empty_records_report(auth_client, app, user_ids):
     """
     Тест отчёта по рекордам при отсутствии данных
     Проверяет что система корректно обрабатывает ситуацию когда нет данных для отчёта
     """
     # Удаляем все тренировки
-    with app.app_context():
-        editor = User.query.filter_by(username='editor').first()
-        Workout.query.filter_by(owner_id=editor.id).delete()
-        db.session.commit()
+    delete_workouts(user_ids['editor'])
 
     response = auth_client.get('/reports/records')
 
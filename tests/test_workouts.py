@@ -0,0 +1,68 @@
+"""
+Тесты для модуля тренировок
+Проверяет валидацию данных формы при создании и редактировании тренировки
+"""
+import pytest
+from models import db, Workout
+from datetime import date, timedelta
+from sqlalchemy import func, select
+
+
+def test_create_workout_invalid_duration(auth_client, editor_id):
+    """
+    Тест создания тренировки с нечисловой длительностью
+    Проверяет что форма отображается повторно с сообщением об ошибке и тренировка не создаётся
+    """
+    count_query = select(func.count()).select_from(Workout).where(Workout.owner_id == editor_id)
+    workouts_before = db.session.scalar(count_query)
+
+    response = auth_client.post('/workouts/new', data={
+        'date': date.today().strftime('%Y-%m-%d'),
+        'workout_type': 'Силовая',
+        'duration': 'abc'
+    })
+
+    assert response.status_code == 200
+    assert 'Длительность тренировки должна быть целым числом минут'.encode() in response.data
+
+    # Проверка что тренировка не создана
+    assert db.session.scalar(count_query) == workouts_before
+
+
+def test_edit_workout_invalid_duration(auth_client, sample_workout):
+    """
+    Тест редактирования тренировки с нечисловой длительностью
+    Проверяет что форма отображается повторно с сообщением об ошибке и тренировка не изменяется
+    """
+    workout_columns = select(Workout.date, Workout.workout_type, Workout.duration).where(Workout.id == sample_workout)
+    workout_before = db.session.execute(workout_columns).one()
+
+    response = auth_client.post(f'/workouts/{sample_workout}/edit', data={
+        'date': (date.today() - timedelta(days=1)).strftime('%Y-%m-%d'),
+        'workout_type': 'Кардио',
+        'duration': 'abc'
+    })
+
+    assert response.status_code == 200
+    assert 'Длительность тренировки должна быть целым числом минут'.encode() in response.data
+
+    # Проверка что данные тренировки не изменились
+    assert db.session.execute(workout_columns).one() == workout_before
+
+
+def test_create_workout_empty_duration(auth_client):
+    """
+    Тест создания тренировки без указания длительности
+    Проверяет что длительность необязательна и сохраняется как пустое значение
+    """
+    response = auth_client.post('/workouts/new', data={
+        'date': date.today().strftime('%Y-%m-%d'),
+        'workout_type': 'Силовая',
+        'duration': ''
+    })
+
+    assert response.status_code == 302
+
+    # ID новой тренировки берётся из адреса редиректа на её страницу
+    workout_id = int(response.location.rsplit('/', 1)[1])
+    assert db.session.scalar(select(Workout.duration).where(Workout.id == workout_id)) is None
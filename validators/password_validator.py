@@ -2,6 +2,28 @@
 Валидатор паролей для системы
 """
 import re
+import string
+
+# Битовые флаги классов символов пароля
+_UPPER = 1
+_LOWER = 2
+_DIGIT = 4
+_SPACE = 8
+_DISALLOWED = 16
+
+# Таблица классов разрешённых символов: латиница, кириллица А-Я/а-я, цифры и спец. символы
+# Символы, отсутствующие в таблице, считаются запрещёнными
+_CHAR_CLASSES = {
+    **dict.fromkeys(string.ascii_uppercase + ''.join(map(chr, range(ord('А'), ord('Я') + 1))), _UPPER),
+    **dict.fromkeys(string.ascii_lowercase + ''.join(map(chr, range(ord('а'), ord('я') + 1))), _LOWER),
+    **dict.fromkeys(string.digits, _DIGIT),
+    **dict.fromkeys('~!?@#$%^&*_-+()[]{}></\\|"\'.,:;', 0),
+    ' ': _SPACE,
+}
+
+# Регулярные выражения компилируются один раз при загрузке модуля
+_USERNAME = re.compile(r'^[A-Za-z0-9_-]+$')
+_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
 def password_validator(password):
     """
@@ -27,20 +49,24 @@ def password_validator(password):
     if len(password) > 128:
         return "Пароль должен содержать не более 128 символов!"
     
-    if not re.search(r'[А-ЯA-Z]', password):
+    # Классы всех символов пароля определяются за один проход по строке
+    flags = 0
+    for char in password:
+        flags |= _CHAR_CLASSES.get(char, _DISALLOWED)
+
+    if not flags & _UPPER:
         return "Пароль должен содержать хотя бы одну заглавную букву!"
     
-    if not re.search(r'[а-яa-z]', password):
+    if not flags & _LOWER:
         return "Пароль должен содержать хотя бы одну строчную букву!"
     
-    if not re.search(r'[0-9]', password):
+    if not flags & _DIGIT:
         return "Пароль должен содержать хотя бы одну цифру!"
     
-    if " " in password:
+    if flags & _SPACE:
         return "Пароль не должен содержать пробелов!"
     
-    allowed_characters = r'^[A-Za-zА-Яа-я0-9~!?@#$%^&*_\-+\(\)\[\]\{\}><\/\\|\"\'.,:;]+$'
-    if not re.match(allowed_characters, password):
+    if flags & _DISALLOWED:
         return r"""Используются запрещённые символы! Вводите только латинские или кириллические буквы, 
 цифры 0-9, а также любые из спец. символов: ~ ! ? @ # $ % ^ & * _ - + ( ) [ ] { } > < / \ | " ' . , : ;"""
     
@@ -55,7 +81,7 @@ def validate_username(username):
     if len(username) > 50:
         return "Имя пользователя слишком длинное (максимум 50 символов)!"
     
-    if not re.match(r'^[A-Za-z0-9_-]+$', username):
+    if not _USERNAME.match(username):
         return "Имя пользователя может содержать только латинские буквы, цифры, _ и -"
     
     return None
@@ -66,8 +92,14 @@ def validate_email(email):
     if not email:
         return "Email обязателен для заполнения!"
     
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(email_pattern, email):
+    if len(email) > 100:
+        return "Email слишком длинный (максимум 100 символов)!"
+    
+    # Быстрая проверка наличия "@" и точки в домене до запуска регулярного выражения
+    if '@' not in email or '.' not in email.rsplit('@', 1)[1]:
+        return "Некорректный формат email!"
+    
+    if not _EMAIL.match(email):
         return "Некорректный формат email!"
     
     return None